@@ -0,0 +1,173 @@
+# semantic answer cache for the q&a endpoint
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_question(question):
+    """lowercased, whitespace-collapsed question used for exact matches"""
+    return " ".join(question.lower().split())
+
+def unit_vector(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm == 0:
+        return list(vector)
+    return [x / norm for x in vector]
+
+def cosine(a, b):
+    """cosine similarity of two unit vectors"""
+    return sum(x * y for x, y in zip(a, b))
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed on the question embedding plus the set of
+    retrieved chunk ids. A lookup hits when the same chunks were retrieved and
+    the question embedding is within `threshold` cosine similarity of a cached one.
+
+    Entries are evicted least-recently-used beyond `max_entries` and expire after
+    `ttl_seconds`. The whole cache is dropped when the store fingerprint changes,
+    so re-ingesting the pdf never serves answers built on old content.
+
+    With `persist_path` every stored answer is appended to a jsonl file, which is
+    rewritten with only the live entries once it holds twice as many lines.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=24 * 3600, persist_path=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._persisted_lines = 0
+        self._lock = threading.Lock()
+        if persist_path:
+            self._load()
+
+    @staticmethod
+    def chunk_key(chunk_ids):
+        return "|".join(sorted(str(cid) for cid in chunk_ids))
+
+    @staticmethod
+    def entry_key(question, chunk_key):
+        return hashlib.sha256(f"{normalize_question(question)}\x00{chunk_key}".encode("utf-8")).hexdigest()
+
+    def _check_fingerprint(self, fingerprint):
+        """drops everything if the vector store changed since the entries were cached"""
+        if fingerprint != self.fingerprint:
+            if self._entries:
+                print("vector store changed, clearing answer cache")
+            self._entries.clear()
+            self.fingerprint = fingerprint
+            if self.persist_path:
+                self._compact()
+
+    def _expired(self, entry, now):
+        return self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds
+
+    def lookup(self, question, embedding, chunk_ids, fingerprint):
+        """returns the cached entry for this question/retrieval, or None"""
+        chunk_key = self.chunk_key(chunk_ids)
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            # exact question match first, it needs no similarity computation
+            key = self.entry_key(question, chunk_key)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is None and embedding is not None:
+                query = unit_vector(embedding)
+                best_score = self.threshold
+                for candidate_key, candidate in list(self._entries.items()):
+                    if self._expired(candidate, now):
+                        del self._entries[candidate_key]
+                        continue
+                    if candidate["chunk_key"] != chunk_key or candidate["embedding"] is None:
+                        continue
+                    score = cosine(query, candidate["embedding"])
+                    if score >= best_score:
+                        best_score, key, entry = score, candidate_key, candidate
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, question, embedding, chunk_ids, fingerprint, answer, context):
+        chunk_key = self.chunk_key(chunk_ids)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            key = self.entry_key(question, chunk_key)
+            entry = {
+                "question": question,
+                "embedding": unit_vector(embedding) if embedding is not None else None,
+                "chunk_key": chunk_key,
+                "answer": answer,
+                "context": context,
+                "created": time.time(),
+            }
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.persist_path:
+                self._append(key, entry)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _append(self, key, entry):
+        if self._persisted_lines >= 2 * self.max_entries:
+            self._compact()
+            return
+        with open(self.persist_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "entry": entry}) + "\n")
+        self._persisted_lines += 1
+
+    def _compact(self):
+        """rewrites the file as the fingerprint line followed by the live entries"""
+        tmp_path = self.persist_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"fingerprint": self.fingerprint}) + "\n")
+            for key, entry in self._entries.items():
+                f.write(json.dumps({"key": key, "entry": entry}) + "\n")
+        os.replace(tmp_path, self.persist_path)
+        self._persisted_lines = len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line cut short by a crash, the rest of the file is still fine
+                        continue
+                    if "fingerprint" in record:
+                        self.fingerprint = record["fingerprint"]
+                        self._entries.clear()
+                        continue
+                    self._entries[record["key"]] = record["entry"]
+                    self._entries.move_to_end(record["key"])
+                    self._persisted_lines += 1
+        except (OSError, KeyError, TypeError) as e:
+            print(f"ignoring unreadable answer cache {self.persist_path}: {e}")
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,9 +1,12 @@
 # api server for react frontend
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g, has_request_context
 import os
 from flask_cors import CORS
+from contextlib import contextmanager
+import json
 import sys
 import os
+import time
 
 # add current directory to python path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -13,14 +16,27 @@ from langchain_ollama.llms import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
 
 # import retriever from railway_vector.py file
-from railway_vector import retriever
-from bpmn_generator import generate_bpmn_from_description as bpmn_generator
+from railway_vector import (get_retriever, get_vector_store, doc_chunk_id, doc_source_id, store_fingerprint,
+                            embedding_model, page_store_dir, get_edition, editions as registered_editions,
+                            default_editions)
+from answer_cache import SemanticAnswerCache, normalize_question
+from bpmn_generator import (bpmn_prompt, bpmn_format_context, raw_mermaid, repair_mermaid_script, bpmn_prompt_tokens,
+                            bpmn_cache, bpmn_cache_enabled)
+from concurrency import GenerationLimiter, RequestCoalescer, ServerBusy
+from context_builder import assemble_context, estimate_tokens
+from sections import section_label
+from health_monitor import HealthMonitor, ollama_probe, vectordb_probe
+from page_store import PageStore
+from editions import parse_editions
+from warmup import ModelWarmer, keep_alive, warmup_enabled, warmup_interval, warmup_timeout
+from batch_qa import parse_questions_jsonl, answer_batch
+import metrics
 
 app = Flask(__name__)
 CORS(app)  # enable cors for react frontend
 
-# using llama 3.2
-model = OllamaLLM(model="llama3.2")
+# using llama 3.2, kept loaded for RAG_KEEP_ALIVE after each request
+model = OllamaLLM(model="llama3.2", keep_alive=keep_alive)
 
 # qa template - same as in main.py
 qa_template = """
@@ -30,7 +46,7 @@ Your task is to answer the user's question by following these steps:
 2.  After providing the direct answer, look through ALL the context provided. If there are any important exceptions, conditions, or related details (like different rules for specific routes or situations), add a section called "Additional Context" and briefly list them.
 3.  Base your entire response ONLY on the provided context. Do not add information or reasoning that is not present.
 4.  If the context does not contain a direct answer, state that you cannot find the information in the provided document.
-5.  Cite the source page number(s) for your information.
+5.  Cite the source section and page number(s) for your information, and the edition when the sources name one.
 
 Here is the context:
 {context}
@@ -42,110 +58,762 @@ Here is the question:
 qa_prompt = ChatPromptTemplate.from_template(qa_template)
 qa_chain = qa_prompt | model
 
+# answers are reused for near-identical questions that retrieve the same chunks
+answer_cache_enabled = os.environ.get("RAG_ANSWER_CACHE", "1") == "1"
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.environ.get("RAG_ANSWER_CACHE_TTL", str(24 * 3600))),
+    persist_path=os.environ.get("RAG_ANSWER_CACHE_PATH") or None,
+)
+
+# at most `max_concurrent` llm generations hit ollama at once, a bounded queue waits behind them
+generation_limiter = GenerationLimiter(
+    max_concurrent=int(os.environ.get("RAG_MAX_CONCURRENT_GENERATIONS", "2")),
+    max_queued=int(os.environ.get("RAG_MAX_QUEUED_GENERATIONS", "8")),
+    queue_timeout=float(os.environ.get("RAG_QUEUE_TIMEOUT", "120")),
+)
+# identical in-flight questions / process descriptions share one generation; the callers
+# waiting on it give up once a queued generation would have timed out or finished
+generation_timeout = float(os.environ.get("RAG_GENERATION_TIMEOUT", "300"))
+coalescer = RequestCoalescer(wait_timeout=generation_limiter.queue_timeout + generation_timeout)
+
+# cited pages are served from the per-page store each edition builds at ingestion
+page_stores = {name: PageStore(page_store_dir(edition.pdf_path, name)) for name, edition in registered_editions.items()}
+
+# ollama and chroma are probed on a background thread, the health endpoints only read the results
+health_monitor = HealthMonitor({
+    'ollama': ollama_probe([model.model, embedding_model], timeout=float(os.environ.get("RAG_HEALTH_TIMEOUT", "2"))),
+    'vectordb': vectordb_probe(get_vector_store, list(registered_editions)),
+}, interval=float(os.environ.get("RAG_HEALTH_INTERVAL", "30"))).start()
+
+def warm_retriever():
+    """opens every edition's collection and loads its retrieval indexes, which the first question would otherwise pay for"""
+    for retriever in get_retriever().retrievers.values():
+        retriever.vector_store._collection.count()
+        # each property loads its index file on first access
+        retriever.keyword_index
+        retriever.flat_index
+        retriever.section_index
+
+# both models are loaded (and the indexes opened) on a background thread at startup,
+# so the first request doesn't wait for ollama to load them
+model_warmer = ModelWarmer([model.model], [embedding_model], interval=warmup_interval,
+                           timeout=warmup_timeout, extra={'retriever': warm_retriever})
+if warmup_enabled:
+    model_warmer.start()
+
+# per-request stage timings go out as a Server-Timing header when enabled here
+# or when the client sends `X-Request-Timing: 1`
+timing_header_enabled = os.environ.get("RAG_TIMING_HEADER", "0") == "1"
+
+metrics.registry.register(metrics.Gauge(
+    "rag_generations_active", "LLM generations currently running", lambda: generation_limiter.active))
+metrics.registry.register(metrics.Gauge(
+    "rag_generations_waiting", "Requests waiting for a generation slot", lambda: generation_limiter.waiting))
+
+def record_stage(name, seconds):
+    """observes a pipeline stage in the metrics and in the current request's timings"""
+    metrics.stage_seconds.observe(seconds, name)
+    if has_request_context():
+        timings = g.setdefault('timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def observed_stream(chain, inputs, kind):
+    """streams a chain, recording time to first token, total generation time and tokens/sec"""
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    for token in chain.stream(inputs):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            record_stage('llm_first_token', first_token_at - started)
+        tokens += 1
+        yield token
+    finished = time.perf_counter()
+    record_stage('llm_total', finished - started)
+    if first_token_at is not None and finished > first_token_at:
+        metrics.generation_tokens_per_second.observe(tokens / (finished - first_token_at), kind)
+
+def generate_text(chain, inputs, kind):
+    """blocking generation that still goes through the instrumented stream"""
+    return "".join(observed_stream(chain, inputs, kind))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    metrics.requests_total.inc(endpoint, str(response.status_code))
+    metrics.request_seconds.observe(elapsed, endpoint)
+    if timing_header_enabled or request.headers.get('X-Request-Timing') == '1':
+        timings = dict(g.get('timings', {}))
+        timings['total'] = elapsed
+        response.headers['Server-Timing'] = ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+    return response
+
+def retrieve_for_question(question, section=None, editions=None):
+    """
+    Retrieval plus answer-cache lookup shared by the blocking and streaming q&a endpoints,
+    optionally limited to one chapter or section ("4", "4.2.1") and to some editions
+    (the default editions when None).
+    Returns a dict with the retrieved docs, formatted context and the cached answer (or None).
+    """
+    # retrieve relevant documents from vector database, the embedding is reused as the cache key
+    # (exact-term lookups skip embedding entirely and only hit the cache on the exact question)
+    retriever = get_retriever()
+    question_embedding = None
+    if retriever.wants_embedding(question, editions):
+        with stage('embed'):
+            question_embedding = retriever.embed_query(question)
+    with stage('retrieve'):
+        retrieved_docs, retrieval_cached = retriever.lookup(question, embedding=question_embedding, section=section,
+                                                            editions=editions)
+    metrics.cache_lookups.inc('retrieval', 'hit' if retrieval_cached else 'miss')
+    metrics.retrieved_chunks.observe(len(retrieved_docs))
+    # format context with page numbers for citation, merging overlapping chunks within the token budget
+    with stage('context_format'):
+        assembled = assemble_context(retrieved_docs)
+    context = assembled['context']
+
+    retrieval = {
+        'question': question,
+        'embedding': question_embedding,
+        'docs': retrieved_docs,
+        'context': context,
+        'prompt_tokens': estimate_tokens(qa_prompt.format(context=context, question=question)),
+        'context_tokens': assembled['context_tokens'],
+        'chunks_used': assembled['chunks_used'],
+        'sections': assembled['sections'],
+        'editions': assembled['editions'],
+        'chunk_ids': [doc_source_id(doc) for doc in retrieved_docs],
+        'fingerprint': None,
+        'cached': None,
+    }
+    metrics.prompt_tokens.observe(retrieval['prompt_tokens'], 'qa')
+    if answer_cache_enabled:
+        retrieval['fingerprint'] = store_fingerprint()
+        retrieval['cached'] = answer_cache.lookup(
+            question, question_embedding, retrieval['chunk_ids'], retrieval['fingerprint'])
+        metrics.cache_lookups.inc('answer', 'hit' if retrieval['cached'] is not None else 'miss')
+    return retrieval
+
+def remember_answer(retrieval, answer):
+    """stores a freshly generated answer in the answer cache"""
+    if answer_cache_enabled:
+        answer_cache.store(retrieval['question'], retrieval['embedding'], retrieval['chunk_ids'],
+                           retrieval['fingerprint'], answer, retrieval['context'])
+
+def busy_response(error):
+    """clean 503 for requests rejected by the generation limiter"""
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def generation_key(kind, text, retrieval):
+    """
+    coalescer key of one generation: the same question or description answered from the
+    same chunks is generated once while in flight, for blocking and streamed requests alike
+    """
+    return (kind, normalize_question(text), tuple(retrieval['chunk_ids']))
+
+def generate_answer(retrieval):
+    """one bounded generation for a retrieved question, stored in the answer cache"""
+    with generation_limiter.slot():
+        answer = generate_text(qa_chain, {"context": retrieval['context'], "question": retrieval['question']}, 'qa')
+    remember_answer(retrieval, answer)
+    return answer
+
+def answer_question(question, section=None, editions=None):
+    """retrieval, cache lookup and (bounded) generation for one question"""
+    retrieval = retrieve_for_question(question, section, editions)
+    if retrieval['cached'] is not None:
+        return {
+            'answer': retrieval['cached']['answer'],
+            'context': retrieval['context'],
+            'sources': len(retrieval['docs']),
+            'sections': retrieval['sections'],
+            'editions': retrieval['editions'],
+            'prompt_tokens': retrieval['prompt_tokens'],
+            'cached': True
+        }
+
+    # generate answer using llm with retrieved context
+    result = coalescer.run(generation_key('qa', question, retrieval), lambda: generate_answer(retrieval))
+    return {
+        'answer': result,
+        'context': retrieval['context'],
+        'sources': len(retrieval['docs']),
+        'sections': retrieval['sections'],
+        'editions': retrieval['editions'],
+        'prompt_tokens': retrieval['prompt_tokens'],
+        'cached': False
+    }
+
+def retrieve_for_bpmn(description, force_regenerate=False):
+    """
+    the regulatory context for a process description, with stage timings,
+    plus the cached diagram for this description and context (None on a miss)
+    """
+    with stage('retrieve'):
+        retrieved_docs = get_retriever().invoke(description)
+    metrics.retrieved_chunks.observe(len(retrieved_docs))
+    retrieval = {
+        'context': None,
+        'chunk_ids': [doc_source_id(doc) for doc in retrieved_docs],
+        'fingerprint': None,
+        'cached': None,
+    }
+    if bpmn_cache_enabled:
+        retrieval['fingerprint'] = store_fingerprint()
+        if not force_regenerate:
+            retrieval['cached'] = bpmn_cache.get(description, retrieval['chunk_ids'], retrieval['fingerprint'])
+            metrics.cache_lookups.inc('bpmn', 'hit' if retrieval['cached'] is not None else 'miss')
+            if retrieval['cached'] is not None:
+                return retrieval
+    with stage('context_format'):
+        retrieval['context'] = bpmn_format_context(retrieved_docs)
+    metrics.prompt_tokens.observe(bpmn_prompt_tokens(description, retrieval['context']), 'bpmn')
+    return retrieval
+
+def bpmn_result(entry, cached):
+    """api response for a cached or freshly generated diagram"""
+    return {
+        'mermaid_script': entry['mermaid_script'],
+        'description': entry['description'],
+        'prompt_tokens': entry.get('prompt_tokens'),
+        'diagram_id': entry['diagram_id'],
+        'issues': entry.get('issues', []),
+        'cached': cached
+    }
+
+def remember_diagram(description, retrieval, repaired):
+    """stores a freshly generated diagram (script, repair issues) in the bpmn cache, returns its cache entry"""
+    mermaid_script, issues = repaired
+    entry = {
+        'diagram_id': bpmn_cache.diagram_id(description, retrieval['chunk_ids']),
+        'description': description,
+        'mermaid_script': mermaid_script,
+        'prompt_tokens': bpmn_prompt_tokens(description, retrieval['context']),
+        'issues': issues,
+    }
+    if bpmn_cache_enabled:
+        entry = bpmn_cache.put(description, retrieval['chunk_ids'], mermaid_script,
+                               retrieval['fingerprint'], prompt_tokens=entry['prompt_tokens'], issues=issues)
+    return entry
+
+def postprocess_mermaid(response):
+    """(repaired mermaid script, issues found by the parser and the structural checks)"""
+    with stage('mermaid_postprocess'):
+        return repair_mermaid_script(raw_mermaid(response))
+
+def generate_diagram(description, retrieval):
+    """one bounded generation for a retrieved process description, returns its cache entry"""
+    with generation_limiter.slot():
+        response = generate_text(bpmn_prompt | model, {
+            "regulatory_context": retrieval['context'],
+            "process_description": description
+        }, 'bpmn')
+    return remember_diagram(description, retrieval, postprocess_mermaid(response))
+
+def generate_bpmn(description, force_regenerate=False):
+    """retrieval, cache lookup and (bounded) generation for one process description"""
+    retrieval = retrieve_for_bpmn(description, force_regenerate)
+    if retrieval['cached'] is not None:
+        return bpmn_result(retrieval['cached'], True)
+    entry = coalescer.run(generation_key('bpmn', description, retrieval),
+                          lambda: generate_diagram(description, retrieval))
+    return bpmn_result(entry, False)
+
+def join_generation(kind, text, retrieval):
+    """
+    (key, leader, call) for a streamed generation. The leader holds a reserved place in
+    the generation queue and must publish its result with coalescer.finish; followers
+    replay the leader's result and take no generation slot.
+    """
+    key = generation_key(kind, text, retrieval)
+    leader, call = coalescer.join(key)
+    if leader:
+        try:
+            generation_limiter.reserve()
+        except ServerBusy as e:
+            coalescer.finish(key, call, error=e)
+            raise
+    return key, leader, call
+
+def sse(event, data):
+    """formats one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """streams a generator of server-sent events without buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        # no-transform keeps compressing proxies (e.g. the react dev server) from buffering the stream
+        headers={'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'}
+    )
+
+def requested_section(data):
+    """the optional chapter or section filter of a q&a request ("4", "4.2.1"), None for the whole document"""
+    section = data.get('section') or data.get('chapter')
+    if section is None:
+        return None
+    return str(section).strip().rstrip('.') or None
+
+def requested_editions(data):
+    """the optional `editions` of a request (list or "2025,2026"), None for the default editions; ValueError if unknown"""
+    return parse_editions(data.get('editions') or data.get('edition'), registered_editions)
+
+def page_citations(docs):
+    """page and edition of every retrieved chunk, for the cited-page links"""
+    return [{'page': doc.metadata.get('page'), 'edition': doc.metadata.get('edition')} for doc in docs]
+
 @app.route('/api/qa', methods=['POST'])
 def qa_endpoint():
     """handle q&a requests from frontend"""
     try:
         data = request.get_json()
         question = data.get('question', '')
+        section = requested_section(data)
         
         if not question:
             return jsonify({'error': 'question is required'}), 400
+        try:
+            editions = requested_editions(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # retrieve relevant documents from vector database
-        retrieved_docs = retriever.invoke(question)
-        # format context with page numbers for citation
-        context = "\n\n".join([f"Source (Page {doc.metadata.get('page', 'N/A')}):\n{doc.page_content}" for doc in retrieved_docs])
-        
-        # generate answer using llm with retrieved context
-        result = qa_chain.invoke({"context": context, "question": question})
-        
-        return jsonify({
-            'answer': result,
-            'context': context,
-            'sources': len(retrieved_docs)
-        })
+        return jsonify(coalescer.run(('qa', normalize_question(question), section, tuple(editions or ())),
+                                     lambda: answer_question(question, section, editions)))
     
+    except ServerBusy as e:
+        return busy_response(e)
     except Exception as e:
         print(f"error in qa endpoint: {e}")
         return jsonify({'error': 'internal server error'}), 500
 
+@app.route('/api/qa/stream', methods=['POST'])
+def qa_stream_endpoint():
+    """
+    streaming q&a: sends a `sources` event as soon as retrieval is done,
+    then `token` events as the llm generates and a final `done` event
+    """
+    try:
+        data = request.get_json()
+        question = data.get('question', '')
+        section = requested_section(data)
+
+        if not question:
+            return jsonify({'error': 'question is required'}), 400
+        try:
+            editions = requested_editions(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        retrieval = retrieve_for_question(question, section, editions)
+        # a full queue is still a clean 503, but the slot itself is waited for after `sources` is sent
+        key, leader, call = None, False, None
+        if retrieval['cached'] is None:
+            key, leader, call = join_generation('qa', question, retrieval)
+    except ServerBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"error in qa stream endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
+
+    def events():
+        # the reservation is given back if the client goes away before generation starts,
+        # and waiting followers always hear how the generation ended
+        reserved, published, failure = leader, False, None
+        try:
+            yield sse('sources', {
+                'context': retrieval['context'],
+                'sources': len(retrieval['docs']),
+                'pages': [doc.metadata.get('page') for doc in retrieval['docs']],
+                'citations': page_citations(retrieval['docs']),
+                'sections': retrieval['sections'],
+                'editions': retrieval['editions'],
+                'prompt_tokens': retrieval['prompt_tokens']
+            })
+            if retrieval['cached'] is not None:
+                yield sse('token', {'text': retrieval['cached']['answer']})
+                yield sse('done', {'cached': True})
+                return
+            if not leader:
+                # the same question is already being generated, its answer is replayed in one event
+                yield sse('token', {'text': call.wait()})
+                yield sse('done', {'cached': False})
+                return
+            parts = []
+            reserved = False
+            with generation_limiter.slot(reserved=True):
+                for token in observed_stream(qa_chain, {"context": retrieval['context'], "question": question}, 'qa'):
+                    parts.append(token)
+                    yield sse('token', {'text': token})
+            answer = "".join(parts)
+            remember_answer(retrieval, answer)
+            coalescer.finish(key, call, answer)
+            published = True
+            yield sse('done', {'cached': False})
+        except ServerBusy as e:
+            failure = e
+            yield sse('error', {'error': str(e)})
+        except Exception as e:
+            failure = e
+            print(f"error in qa stream endpoint: {e}")
+            yield sse('error', {'error': 'internal server error'})
+        finally:
+            if reserved:
+                generation_limiter.cancel()
+            if leader and not published:
+                coalescer.finish(key, call, error=failure or RuntimeError("request was cancelled"))
+
+    return sse_response(events())
+
+# characters of each chunk returned by /api/retrieve
+retrieve_preview_chars = 300
+
+@app.route('/api/retrieve', methods=['POST'])
+def retrieve_endpoint():
+    """
+    retrieval only, no generation: the chunks a question would be answered from.
+    the q&a interface calls this while the question is being typed, so by the time
+    it is submitted its embedding and retrieval are already cached
+    """
+    try:
+        data = request.get_json()
+        question = data.get('question', '')
+        section = requested_section(data)
+
+        if not question:
+            return jsonify({'error': 'question is required'}), 400
+        try:
+            editions = requested_editions(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # same embedding and retrieval path as /api/qa, so both share the cache entries
+        started = time.perf_counter()
+        retriever = get_retriever()
+        question_embedding = retriever.embed_query(question) if retriever.wants_embedding(question, editions) else None
+        docs, cached = retriever.lookup(question, embedding=question_embedding, section=section, editions=editions)
+        metrics.cache_lookups.inc('retrieval', 'hit' if cached else 'miss')
+        return jsonify({
+            'question': question,
+            'cached': cached,
+            'retrieve_ms': round((time.perf_counter() - started) * 1000, 1),
+            'chunks': [{
+                'chunk_id': doc_chunk_id(doc),
+                'page': doc.metadata.get('page'),
+                'edition': doc.metadata.get('edition'),
+                'section': section_label(doc.metadata),
+                'preview': doc.page_content[:retrieve_preview_chars],
+            } for doc in docs],
+            'pages': [doc.metadata.get('page') for doc in docs],
+            'citations': page_citations(docs),
+        })
+
+    except Exception as e:
+        print(f"error in retrieve endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
+
+# upper bound on questions per /api/qa/batch request
+max_batch_size = int(os.environ.get("RAG_MAX_BATCH_SIZE", "1000"))
+
+@app.route('/api/qa/batch', methods=['POST'])
+def qa_batch_endpoint():
+    """
+    batch q&a: the body is jsonl (one {"question": ...} per line) or json {"questions": [...]}.
+    results stream back as jsonl in completion order, each with its id and timings.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and isinstance(data.get('questions'), list):
+            lines = [json.dumps(q) for q in data['questions']]
+        else:
+            lines = request.get_data(as_text=True).splitlines()
+        items = parse_questions_jsonl(lines)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not items:
+        return jsonify({'error': 'at least one question is required'}), 400
+    if len(items) > max_batch_size:
+        return jsonify({'error': f'at most {max_batch_size} questions per batch'}), 400
+
+    # a batch never runs more generations at once than the server-wide limit allows
+    requested = request.args.get('concurrency', type=int) or generation_limiter.max_concurrent
+    concurrency = max(1, min(requested, generation_limiter.max_concurrent))
+
+    def invoke(inputs):
+        with generation_limiter.slot():
+            return generate_text(qa_chain, inputs, 'qa')
+
+    def lines_out():
+        try:
+            for result in answer_batch(items, qa_prompt, invoke, concurrency=concurrency):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            print(f"error in qa batch endpoint: {e}")
+            yield json.dumps({'error': 'internal server error'}) + "\n"
+
+    return Response(stream_with_context(lines_out()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache, no-transform', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/bpmn', methods=['POST'])
 def bpmn_endpoint():
     """handle bpmn generation requests from frontend"""
     try:
         data = request.get_json()
         description = data.get('description', '')
+        force_regenerate = bool(data.get('force_regenerate', False))
         
         if not description:
             return jsonify({'error': 'description is required'}), 400
         
         # generate mermaid script using bpmn_generator
-        mermaid_script = bpmn_generator(description, model)
-        
-        return jsonify({
-            'mermaid_script': mermaid_script,
-            'description': description
-        })
+        return jsonify(coalescer.run(('bpmn', normalize_question(description), force_regenerate),
+                                     lambda: generate_bpmn(description, force_regenerate)))
     
+    except ServerBusy as e:
+        return busy_response(e)
     except Exception as e:
         print(f"error in bpmn endpoint: {e}")
         return jsonify({'error': 'internal server error'}), 500
 
+@app.route('/api/bpmn/stream', methods=['POST'])
+def bpmn_stream_endpoint():
+    """
+    streaming bpmn generation: `token` events with the raw llm output,
+    then a `mermaid` event with the final post-processed script
+    """
+    try:
+        data = request.get_json()
+        description = data.get('description', '')
+        force_regenerate = bool(data.get('force_regenerate', False))
+
+        if not description:
+            return jsonify({'error': 'description is required'}), 400
+
+        retrieval = retrieve_for_bpmn(description, force_regenerate)
+        if retrieval['cached'] is not None:
+            # a cached diagram needs no generation slot
+            return sse_response(iter([sse('mermaid', bpmn_result(retrieval['cached'], True))]))
+        # rejected up front when the queue is full, the slot is waited for inside the stream
+        key, leader, call = join_generation('bpmn', description, retrieval)
+    except ServerBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"error in bpmn stream endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
+
+    def events():
+        reserved, published, failure = leader, False, None
+        try:
+            # an sse comment, ignored by clients, so the response starts before the wait for a slot
+            yield ": waiting for a generation slot\n\n"
+            if not leader:
+                # the same description is already being generated, its diagram is replayed
+                yield sse('mermaid', bpmn_result(call.wait(), False))
+                return
+            parts = []
+            reserved = False
+            with generation_limiter.slot(reserved=True):
+                for token in observed_stream(bpmn_prompt | model, {
+                    "regulatory_context": retrieval['context'],
+                    "process_description": description
+                }, 'bpmn'):
+                    parts.append(token)
+                    yield sse('token', {'text': token})
+            entry = remember_diagram(description, retrieval, postprocess_mermaid("".join(parts)))
+            coalescer.finish(key, call, entry)
+            published = True
+            yield sse('mermaid', bpmn_result(entry, False))
+        except ServerBusy as e:
+            failure = e
+            yield sse('error', {'error': str(e)})
+        except Exception as e:
+            failure = e
+            print(f"error in bpmn stream endpoint: {e}")
+            yield sse('error', {'error': 'internal server error'})
+        finally:
+            if reserved:
+                generation_limiter.cancel()
+            if leader and not published:
+                coalescer.finish(key, call, error=failure or RuntimeError("request was cancelled"))
+
+    return sse_response(events())
+
+@app.route('/api/bpmn/<diagram_id>', methods=['GET'])
+def bpmn_by_id(diagram_id):
+    """re-opens a generated diagram by its `diagram_id`, without retrieval or generation"""
+    entry = bpmn_cache.get_by_id(diagram_id)
+    if entry is None:
+        return jsonify({'error': 'diagram not found'}), 404
+    return jsonify(bpmn_result(entry, True))
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """prometheus metrics"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """entries and hit rate of every cache: answers, bpmn diagrams, query embeddings and retrieval results"""
+    return jsonify({'answer': answer_cache.stats(), 'bpmn': bpmn_cache.stats(), **get_retriever().stats()})
+
+@app.route('/api/load', methods=['GET'])
+def load_stats():
+    """generations running and waiting"""
+    return jsonify(generation_limiter.stats())
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'railway rag api is running'})
 
+def health_response(name):
+    """cached health status: 200 while healthy (or still checking), 503 otherwise"""
+    result = health_monitor.status(name)
+    return jsonify(result), (200 if result['status'] in ('healthy', 'checking') else 503)
+
 @app.route('/api/health/ollama', methods=['GET'])
 def ollama_health():
-    """check if ollama is running and models are available"""
-    try:
-        # Try to create a model instance to check if Ollama is running
-        model = OllamaLLM(model="llama3.2")
-        # Try a simple completion to verify model is loaded
-        model.invoke("test")
-        return jsonify({'status': 'healthy', 'message': 'ollama is running and model is loaded'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 503
+    """check if ollama is running and models are available (last background check)"""
+    return health_response('ollama')
 
 @app.route('/api/health/vectordb', methods=['GET'])
 def vectordb_health():
-    """check if vector database is accessible"""
+    """check if vector database is accessible (last background check)"""
+    return health_response('vectordb')
+
+@app.route('/api/health/status', methods=['GET'])
+def health_status():
+    """all cached health checks in one response, for the status panel"""
+    return jsonify(health_monitor.statuses())
+
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def warmup_endpoint():
+    """model warm-up status with cold vs warm latency; POST warms the models again right away"""
     try:
-        # Try to get collection count to verify DB access
-        collection_count = vector_store._collection.count()
-        return jsonify({
-            'status': 'healthy', 
-            'message': f'vector database is accessible with {collection_count} documents'
-        })
+        if request.method == 'POST':
+            return jsonify(model_warmer.warm_now('manual'))
+        return jsonify(model_warmer.status())
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 503
+        print(f"error in warmup endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
 
 @app.route('/NetworkStatement2026.pdf')
 def serve_pdf():
-    """Serve the Network Statement PDF file"""
+    """Serve the Network Statement PDF file, with Range and ETag/If-None-Match support"""
     try:
         pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NetworkStatement2026.pdf')
-        print(f"Attempting to serve PDF from: {pdf_path}")
         if not os.path.exists(pdf_path):
             print(f"PDF file not found at: {pdf_path}")
             return jsonify({'error': 'PDF file not found'}), 404
         
+        # conditional=True answers Range requests with 206 and If-None-Match/If-Modified-Since with 304
         response = send_file(
             pdf_path,
             mimetype='application/pdf',
             as_attachment=False,
-            download_name='NetworkStatement2026.pdf'
+            download_name='NetworkStatement2026.pdf',
+            conditional=True,
+            etag=True,
+            max_age=3600
         )
-        response.headers['Content-Type'] = 'application/pdf'
+        response.headers['Accept-Ranges'] = 'bytes'
         return response
     except Exception as e:
         print(f"Error serving PDF: {str(e)}")
         return jsonify({'error': f'Error serving PDF: {str(e)}'}), 500
 
+@app.route('/api/page/<int:page>', methods=['GET'])
+def page_endpoint(page):
+    """
+    one cited page of the network statement, numbered like the citations:
+    extracted text as json by default, or the single page as a pdf with `?format=pdf`.
+    `?edition=2025` selects the edition, the default edition otherwise.
+    """
+    try:
+        edition = request.args.get('edition') or default_editions[0]
+        if edition not in page_stores:
+            return jsonify({'error': f'unknown edition {edition}'}), 404
+        page_store = page_stores[edition]
+        if not page_store.has_page(page):
+            if page_store.index() is None:
+                return jsonify({'error': 'page store not built, run railway_vector.py to ingest the pdf'}), 404
+            return jsonify({'error': f'page {page} not found'}), 404
+
+        if request.args.get('format') == 'pdf':
+            response = send_file(
+                page_store.pdf_path(page),
+                mimetype='application/pdf',
+                as_attachment=False,
+                download_name=f'{os.path.splitext(os.path.basename(get_edition(edition).pdf_path))[0]}_page_{page}.pdf',
+                conditional=True,
+                etag=page_store.etag(page, 'pdf'),
+                max_age=3600
+            )
+            return response
+
+        response = jsonify({
+            'page': page,
+            'edition': edition,
+            'text': page_store.text(page),
+            'pdf_url': f'/api/page/{page}?format=pdf&edition={edition}'
+        })
+        response.set_etag(page_store.etag(page, 'text'))
+        response.cache_control.max_age = 3600
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"error in page endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
+
+@app.route('/api/sections', methods=['GET'])
+def sections_endpoint():
+    """chapters and sections detected at ingestion, in document order, for the q&a section filter (`?edition=`)"""
+    try:
+        edition = request.args.get('edition') or default_editions[0]
+        if edition not in registered_editions:
+            return jsonify({'error': f'unknown edition {edition}'}), 404
+        index = get_retriever().retriever(edition).section_index
+        if index is None:
+            return jsonify({'error': 'section index not built, run railway_vector.py to ingest the pdf'}), 404
+        return jsonify({'sections': index.listing()})
+    except Exception as e:
+        print(f"error in sections endpoint: {e}")
+        return jsonify({'error': 'internal server error'}), 500
+
+@app.route('/api/editions', methods=['GET'])
+def editions_endpoint():
+    """the registered network statement editions and which of them questions search by default"""
+    return jsonify({'editions': [
+        {**edition.describe(), 'default': name in default_editions} for name, edition in registered_editions.items()
+    ]})
+
 if __name__ == '__main__':
     print("starting railway rag api server...")
     print("frontend should be accessible at http://localhost:3000")
     print("api server running at http://localhost:8000")
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    # requests are served on threads, the generation limiter decides how many reach the llm
+    if os.environ.get("RAG_SERVER") == "waitress":
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=8000,
+              threads=generation_limiter.max_concurrent + generation_limiter.max_queued + 4)
+    else:
+        app.run(host='0.0.0.0', port=8000, debug=os.environ.get("RAG_DEBUG", "0") == "1", threaded=True)
@@ -0,0 +1,108 @@
+# batch question answering shared by main.py (cli) and api_server.py (/api/qa/batch)
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from railway_vector import get_retriever, editions as registered_editions
+from editions import parse_editions
+from context_builder import assemble_context, estimate_tokens
+
+def parse_questions_jsonl(lines):
+    """
+    Reads questions from jsonl lines. Each line is either {"question": ...} (optionally
+    with an "id", a "section" filter and the "editions" to search) or a bare json string.
+    Blank lines are skipped.
+    """
+    items = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: invalid json ({e})")
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not str(record.get("question", "")).strip():
+            raise ValueError(f"line {line_number}: expected an object with a 'question'")
+        try:
+            editions = parse_editions(record.get("editions"), registered_editions)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: {e}")
+        items.append({"id": record.get("id", len(items)), "question": record["question"],
+                      "section": record.get("section") or record.get("chapter"), "editions": editions})
+    return items
+
+def retrieve_batch(items, editions=None):
+    """
+    Retrieval for the whole batch up front: every question that needs an embedding
+    and is not in the embedding cache is embedded in one batched call, then the
+    searches run in parallel. `editions` is searched for items without editions of their own.
+    Returns one dict per item with its context and retrieval timings.
+    """
+    items = [{**item, "editions": item.get("editions") or editions} for item in items]
+    retriever = get_retriever()
+    started = time.perf_counter()
+    to_embed = [item for item in items if retriever.wants_embedding(item["question"], item.get("editions"))]
+    vectors = retriever.embed_queries([item["question"] for item in to_embed]) if to_embed else []
+    embeddings = {id(item): vector for item, vector in zip(to_embed, vectors)}
+    # the batch embedding cost is shared evenly between the questions that needed it
+    embed_ms = (time.perf_counter() - started) * 1000 / len(to_embed) if to_embed else 0.0
+
+    def search(item):
+        search_started = time.perf_counter()
+        docs = retriever.invoke(item["question"], embedding=embeddings.get(id(item)),
+                                section=item.get("section"), editions=item.get("editions"))
+        assembled = assemble_context(docs)
+        return {
+            **item,
+            "docs": docs,
+            "assembled": assembled,
+            "timings": {
+                "embed_ms": embed_ms if id(item) in embeddings else 0.0,
+                "search_ms": (time.perf_counter() - search_started) * 1000,
+            },
+        }
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(search, items))
+
+def answer_batch(items, qa_prompt, invoke, concurrency=4, editions=None):
+    """
+    Answers a batch of questions, yielding one result dict per question as soon
+    as its generation finishes (so not necessarily in input order). `invoke` takes
+    the prompt inputs and returns the answer, e.g. qa_chain.invoke. `editions` is
+    searched for questions that name no editions of their own.
+    """
+    retrieved = retrieve_batch(items, editions)
+
+    def generate(item):
+        context = item["assembled"]["context"]
+        started = time.perf_counter()
+        result = {
+            "id": item["id"],
+            "question": item["question"],
+            "pages": item["assembled"]["pages"],
+            "sections": item["assembled"]["sections"],
+            "prompt_tokens": estimate_tokens(qa_prompt.format(context=context, question=item["question"])),
+        }
+        try:
+            result["answer"] = invoke({"context": context, "question": item["question"]})
+        except Exception as e:
+            result["error"] = str(e)
+        timings = dict(item["timings"])
+        timings["generation_ms"] = (time.perf_counter() - started) * 1000
+        timings["total_ms"] = timings["embed_ms"] + timings["search_ms"] + timings["generation_ms"]
+        result["timings"] = {name: round(value, 1) for name, value in timings.items()}
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(generate, item) for item in retrieved]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # the consumer went away (e.g. the http client disconnected), don't start the rest
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,154 @@
+# result cache for generated bpmn diagrams
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from answer_cache import normalize_question
+
+class BpmnResultCache:
+    """
+    Caches post-processed mermaid scripts keyed on the normalized process description
+    plus the ids of the retrieved regulatory chunks. Chunk ids are content hashes, so a
+    description whose chunks were re-ingested with new text simply misses.
+
+    A bounded LRU lives in memory; with `persist_dir` every entry is also written there as
+    one json file (at most `max_disk_entries`, oldest removed first), so diagrams survive
+    restarts and can be re-opened by `diagram_id`. When the store fingerprint changes,
+    entries citing chunks that no longer exist are dropped from both tiers.
+    """
+
+    def __init__(self, max_entries=256, persist_dir=None, max_disk_entries=5000, live_chunk_ids=None):
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.max_disk_entries = max_disk_entries
+        self.live_chunk_ids = live_chunk_ids
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    @staticmethod
+    def diagram_id(description, chunk_ids):
+        chunk_key = "|".join(sorted(str(cid) for cid in chunk_ids))
+        digest = hashlib.sha256(f"{normalize_question(description)}\x00{chunk_key}".encode("utf-8"))
+        return digest.hexdigest()[:24]
+
+    def _path(self, diagram_id):
+        return os.path.join(self.persist_dir, f"{diagram_id}.json")
+
+    def _remember(self, entry):
+        self._entries[entry["diagram_id"]] = entry
+        self._entries.move_to_end(entry["diagram_id"])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, diagram_id):
+        if not self.persist_dir:
+            return None
+        try:
+            with open(self._path(diagram_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"ignoring unreadable cached diagram {diagram_id}: {e}")
+            return None
+
+    def _write_disk(self, entry):
+        path = self._path(entry["diagram_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        files = [name for name in os.listdir(self.persist_dir) if name.endswith(".json")]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=lambda name: os.path.getmtime(os.path.join(self.persist_dir, name)))
+            for name in files[:len(files) - self.max_disk_entries]:
+                os.remove(os.path.join(self.persist_dir, name))
+
+    def _check_fingerprint(self, fingerprint):
+        """drops entries built on chunks that are gone since the store last changed"""
+        if fingerprint is None or fingerprint == self.fingerprint:
+            return
+        previous, self.fingerprint = self.fingerprint, fingerprint
+        if previous is None and not self.persist_dir:
+            return
+        if self.live_chunk_ids is None:
+            self._entries.clear()
+            return
+        live = self.live_chunk_ids()
+        stale = [key for key, entry in self._entries.items() if not set(entry["chunk_ids"]) <= live]
+        for key in stale:
+            del self._entries[key]
+        removed = len(stale)
+        if self.persist_dir:
+            for name in os.listdir(self.persist_dir):
+                if not name.endswith(".json") or name[:-5] in self._entries:
+                    continue
+                entry = self._read_disk(name[:-5])
+                if entry is not None and not set(entry.get("chunk_ids", [])) <= live:
+                    os.remove(self._path(name[:-5]))
+                    removed += 1
+        if removed:
+            print(f"vector store changed, dropped {removed} cached diagram(s)")
+
+    def get(self, description, chunk_ids, fingerprint=None):
+        """the cached entry for this description and retrieval, or None"""
+        diagram_id = self.diagram_id(description, chunk_ids)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(diagram_id)
+            if entry is None:
+                entry = self._read_disk(diagram_id)
+                if entry is not None:
+                    self._remember(entry)
+            else:
+                self._entries.move_to_end(diagram_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get_by_id(self, diagram_id):
+        """re-opens a diagram by id (e.g. from a shared link) without retrieval"""
+        with self._lock:
+            entry = self._entries.get(diagram_id)
+            if entry is None and all(c in "0123456789abcdef" for c in diagram_id):
+                entry = self._read_disk(diagram_id)
+                if entry is not None:
+                    self._remember(entry)
+            return entry
+
+    def put(self, description, chunk_ids, mermaid_script, fingerprint=None, **extra):
+        """stores a generated diagram, returns the new entry"""
+        entry = {
+            "diagram_id": self.diagram_id(description, chunk_ids),
+            "description": description,
+            "chunk_ids": sorted(str(cid) for cid in chunk_ids),
+            "mermaid_script": mermaid_script,
+            "created": time.time(),
+            **extra,
+        }
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._remember(entry)
+            if self.persist_dir:
+                self._write_disk(entry)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,12 +1,24 @@
+import os
 from langchain_core.prompts import ChatPromptTemplate
-from railway_vector import retriever # importing retriever
+from railway_vector import get_retriever, doc_source_id, live_chunk_ids, store_fingerprint # importing retriever
+from bpmn_cache import BpmnResultCache
+from context_builder import assemble_context, estimate_tokens
+from mermaid_parser import repair_mermaid
+
+# generated diagrams are reused for the same description and the same retrieved regulations
+bpmn_cache_enabled = os.environ.get("RAG_BPMN_CACHE", "1") == "1"
+bpmn_cache = BpmnResultCache(
+    max_entries=int(os.environ.get("RAG_BPMN_CACHE_SIZE", "256")),
+    persist_dir=os.environ.get("RAG_BPMN_CACHE_DIR") or None,
+    live_chunk_ids=live_chunk_ids,
+)
 
 def bpmn_format_context(documents):
     """
     A simpler formatter for BPMN generation, as we just need a block of text.
+    Overlapping chunks are merged and the text is kept within the context token budget.
     """
-    context_str = "\n\n".join([doc.page_content for doc in documents])
-    return context_str
+    return assemble_context(documents, with_citations=False)["context"]
 
 # specialized prompt for generating bpmn diagrams
 bpmn_prompt_template = """
@@ -53,83 +65,88 @@ graph TD;
 
 bpmn_prompt = ChatPromptTemplate.from_template(bpmn_prompt_template)
 
+def bpmn_prompt_tokens(description: str, context: str):
+    """estimated size of the full bpmn prompt in tokens"""
+    return estimate_tokens(bpmn_prompt.format(regulatory_context=context, process_description=description))
+
+def repair_mermaid_script(mermaid_code):
+    """
+    Repairs llm-generated mermaid in a single parse (see mermaid_parser.py) and returns
+    (canonical flowchart code, issues): every arrow style becomes "-->", labelled edges use
+    "-->|label|", quoted node ids get generated ids, unconnected node definitions are dropped.
+    The issues list what was skipped or repaired and what the structural checks found
+    (disconnected parts, no start node, gateways with fewer than two branches); they are
+    also printed.
+    """
+    graph = repair_mermaid(mermaid_code)
+    for issue in graph.issues:
+        print(f"mermaid: {issue}")
+    return graph.to_mermaid(), graph.issues
+
 def fix_mermaid_syntax(mermaid_code):
-    import re
-    lines = mermaid_code.split('\n')
-    fixed_lines = []
-    node_id_counter = 1
-    edge_node_ids = set()
-    node_def_lines = []
-    # first pass: fix lines, collect edge node ids and node definitions
-    for line in lines:
-        # remove lines with curly braces used for logic or nesting (not valid in mermaid)
-        if re.search(r'\{.*:.*\}', line) or re.match(r'.*\{\s*$', line) or re.match(r'.*\}\s*$', line):
-            continue  # skip lines with curly brace logic or block
-        # remove lines with colons/arrows inside edge labels (not valid)
-        if re.search(r'--[^-]*:.*-->', line):
-            continue
-        # fix arrows: replace '|>' or '>' with '-->'
-        line = re.sub(r'\|>|(?<!-)>(?!-)', '-->', line)
-        # fix labeled edges with wrong arrow
-        line = re.sub(r'--\|([^|]+)\|>+', r'--|\1|-->', line)
-        # fix quoted node ids: A --> "Label" => A --> B["Label"]
-        match = re.match(r'^(\s*\w+)\s*-->\s*"([^"]+)"', line)
-        if match:
-            src = match.group(1)
-            label = match.group(2)
-            node_id = f"auto{node_id_counter}"
-            node_id_counter += 1
-            line = f'{src} --> {node_id}["{label}"]'
-        # collect edge node ids
-        edge_match = re.match(r'^\s*(\w+)\s*(--\|[^|]+\|)?-->\s*(\w+)', line)
-        if edge_match:
-            edge_node_ids.add(edge_match.group(1))
-            edge_node_ids.add(edge_match.group(3))
-        # collect node definition lines for later filtering
-        if re.match(r'^\s*\w+\[.*\]\s*$', line) or re.match(r'^\s*\w+\{\{.*\}\}\s*$', line):
-            node_def_lines.append(line)
-            continue  # don't add node definitions yet
-        # only allow valid mermaid node/edge definitions or graph header
-        if re.match(r'^\s*\w+\s*(--\|[^|]+\|)?-->9*\w+(\[.*\]|\{\{.*\}\})?;?$', line) or re.match(r'^\s*graph TD;?$', line):
-            fixed_lines.append(line)
-    # second pass: add only node definitions that are referenced in edges
-    for node_line in node_def_lines:
-        node_id = re.match(r'^\s*(\w+)', node_line).group(1)
-        if node_id in edge_node_ids:
-            fixed_lines.append(node_line)
-    return '\n'.join(fixed_lines)
+    """the repaired mermaid code only, see repair_mermaid_script"""
+    return repair_mermaid_script(mermaid_code)[0]
+
+def retrieve_bpmn_context(description: str):
+    """retrieves the regulatory chunks for a process description, returns (documents, context)"""
+    retrieved_docs = get_retriever().invoke(description)
+    return retrieved_docs, bpmn_format_context(retrieved_docs)
+
+def raw_mermaid(response: str):
+    """the mermaid code in the raw llm output, before any repair"""
+    try:
+        # llms often wrap their code output in ```mermaid ... ```
+        mermaid_code = response.split("```mermaid")[1].split("```", 1)[0]
+        mermaid_code = mermaid_code.strip()
+    except IndexError:
+        # if the llm didn't use the wrapper, return the raw response
+        mermaid_code = response.strip()
+    return mermaid_code
+
+def extract_mermaid(response: str):
+    """cleans up the raw llm output into a post-processed mermaid script"""
+    # post-process to fix common mermaid syntax errors
+    return fix_mermaid_syntax(raw_mermaid(response))
 
 # generates mermaid bpmn script using rag
-def generate_bpmn_from_description(description: str, model):
+def generate_bpmn_from_description(description: str, model, force_regenerate=False):
     """
     1. Retrieves context based on the user's description.
-    2. Uses an LLM with a specialized prompt to generate the Mermaid script.
+    2. Returns the cached diagram for this description and context, unless force_regenerate is set.
+    3. Otherwise uses an LLM with a specialized prompt to generate the Mermaid script.
     """
     
     print("Retrieving relevant regulations for your process...")
     
     # 1. use the retriever to find relevant rules and constraints
-    retrieved_docs = retriever.invoke(description)
-    context = bpmn_format_context(retrieved_docs)
+    retrieved_docs, context = retrieve_bpmn_context(description)
+    chunk_ids = [doc_source_id(doc) for doc in retrieved_docs]
+
+    # 2. reuse an earlier diagram built on the same regulations
+    fingerprint = store_fingerprint() if bpmn_cache_enabled else None
+    if bpmn_cache_enabled and not force_regenerate:
+        cached = bpmn_cache.get(description, chunk_ids, fingerprint)
+        if cached is not None:
+            print("Using a previously generated diagram for this description.")
+            return cached["mermaid_script"]
 
-    # 2. create the chain with the bpmn prompt and the llm
+    # 3. generate and clean up the mermaid script
+    mermaid_script = generate_bpmn_from_context(description, model, context)
+    if bpmn_cache_enabled:
+        bpmn_cache.put(description, chunk_ids, mermaid_script, fingerprint)
+    return mermaid_script
+
+def generate_bpmn_from_context(description: str, model, context: str):
+    """generation half of generate_bpmn_from_description, for an already retrieved context"""
+    # 1. create the chain with the bpmn prompt and the llm
     bpmn_chain = bpmn_prompt | model
 
     print("Asking the LLM to generate the BPMN diagram...")
-    # 3. invoke the chain to get the mermaid script
+    # 2. invoke the chain to get the mermaid script
     response = bpmn_chain.invoke({
         "regulatory_context": context,
         "process_description": description
     })
 
-    # 4. clean up the llm output to extract only the mermaid code
-    try:
-        # llms often wrap their code output in ```mermaid ... ```
-        mermaid_code = response.split("```mermaid")[1].split("```", 1)[0]
-        mermaid_code = mermaid_code.strip()
-    except IndexError:
-        # if the llm didn't use the wrapper, return the raw response
-        mermaid_code = response.strip()
-    # post-process to fix common mermaid syntax errors
-    mermaid_code = fix_mermaid_syntax(mermaid_code)
-    return mermaid_code
\ No newline at end of file
+    # 3. clean up the llm output to extract only the mermaid code
+    return extract_mermaid(response)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# concurrency control for llm generations in the api server
+import threading
+from contextlib import contextmanager
+
+class ServerBusy(Exception):
+    """raised when the generation queue is full or a request waited too long for a slot"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class GenerationLimiter:
+    """
+    Bounds the number of llm generations running at once. Up to `max_queued` further
+    requests wait for a slot; anything beyond that is rejected straight away with
+    ServerBusy, as is a request that waits longer than `queue_timeout` seconds.
+    """
+
+    def __init__(self, max_concurrent=2, max_queued=8, queue_timeout=120.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        takes a place in the queue without waiting (ServerBusy when it is full), so a
+        streamed response can be rejected up front but wait for its slot after the first
+        events are sent; follow with acquire(reserved=True) or cancel()
+        """
+        with self._lock:
+            if self.active + self.waiting >= self.max_concurrent + self.max_queued:
+                raise ServerBusy("too many requests in progress, please retry shortly")
+            self.waiting += 1
+
+    def cancel(self):
+        """gives back a reservation that will not be used"""
+        with self._lock:
+            self.waiting -= 1
+
+    def acquire(self, reserved=False):
+        if not reserved:
+            self.reserve()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+        if not acquired:
+            raise ServerBusy("timed out waiting for a free generation slot")
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, reserved=False):
+        self.acquire(reserved)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queued': self.max_queued,
+            }
+
+class _Call:
+    def __init__(self, timeout=None):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.timeout = timeout
+
+    def wait(self):
+        """the leader's result, or its exception raised here; ServerBusy if it takes longer than `timeout` seconds"""
+        if not self.done.wait(self.timeout):
+            raise ServerBusy("timed out waiting for an identical request in progress")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class RequestCoalescer:
+    """
+    Single-flight execution: concurrent calls with the same key share one run of
+    the function. The first caller does the work, the others wait for its result
+    (or its exception).
+
+    `run` covers a plain function call. A leader that produces its result bit by bit
+    (a streamed generation) uses `join` and hands the outcome to `finish` itself.
+    Waiting callers give up with ServerBusy after `wait_timeout` seconds, so a stalled
+    leader never holds them forever.
+    """
+
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """(True, call) for the first caller of a key, who must call finish; (False, call) for the rest, who call call.wait()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return False, call
+            call = self._calls[key] = _Call(self.wait_timeout)
+            return True, call
+
+    def finish(self, key, call, result=None, error=None):
+        """publishes the leader's result (or exception) to the waiting callers"""
+        call.result = result
+        # followers re-raise the error, GeneratorExit or KeyboardInterrupt would escape their handlers
+        call.error = error if error is None or isinstance(error, Exception) else RuntimeError("request was cancelled")
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def run(self, key, fn):
+        leader, call = self.join(key)
+        if not leader:
+            return call.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
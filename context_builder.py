@@ -0,0 +1,156 @@
+# context assembly: merges overlapping chunks, removes duplicated text and packs a token budget
+import math
+import os
+
+from sections import section_label
+
+# default prompt-context budget in tokens, llama3.2 slows down noticeably with long prompts on cpu
+default_token_budget = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+
+def estimate_tokens(text):
+    """rough token count, llama-style tokenizers average about 4 characters per token on english text"""
+    return math.ceil(len(text) / 4) if text else 0
+
+def merge_overlapping(first, second, min_overlap=20, max_overlap=400):
+    """
+    Joins two chunks when one contains the other or the end of `first` repeats
+    the start of `second` (the splitter's chunk_overlap). Returns None otherwise.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    longest = min(len(first), len(second), max_overlap)
+    for size in range(longest, min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+def truncate_to_tokens(text, max_tokens):
+    """cuts text to roughly max_tokens, preferring a sentence or word boundary"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+def page_sort_key(page):
+    """numeric pages in order, anything else ("N/A") after them"""
+    return (0, page, "") if isinstance(page, int) else (1, 0, str(page))
+
+def page_label(pages):
+    pages = sorted(pages, key=page_sort_key)
+    if len(pages) == 1:
+        return f"Page {pages[0]}"
+    return "Pages " + ", ".join(str(page) for page in pages)
+
+def citation_label(passage):
+    """
+    "Section 4.2.1 Title, Page 12", or only the pages for chunks outside any section,
+    prefixed with the edition when chunks come from several editions
+    """
+    parts = [passage["edition"], passage["section"], page_label(passage["pages"])]
+    return ", ".join(part for part in parts if part)
+
+def assemble_context(documents, token_budget=None, with_citations=True):
+    """
+    Builds the prompt context from ranked chunks.
+
+    1. chunks from the same page (of the same edition) that overlap (neighbouring splitter chunks) are merged
+    2. passages fully contained in a higher-ranked passage of the same edition are dropped
+    3. passages are packed best-rank first until the token budget is used up,
+       the last one is truncated if a useful amount of budget is left
+
+    Returns a dict with the context string, its estimated token count, the pages
+    sections and editions cited and how many retrieved chunks ended up in the context.
+    """
+    token_budget = token_budget or default_token_budget
+
+    # 1. merge overlapping chunks from the same page, a passage keeps its best rank
+    passages = []
+    for rank, doc in enumerate(documents):
+        page = doc.metadata.get("page", "N/A")
+        edition = doc.metadata.get("edition_label")
+        text = doc.page_content.strip()
+        merged = False
+        for passage in passages:
+            if passage["page"] != page or passage["edition"] != edition:
+                continue
+            joined = merge_overlapping(passage["text"], text) or merge_overlapping(text, passage["text"])
+            if joined is not None:
+                passage["text"] = joined
+                passage["chunks"] += 1
+                merged = True
+                break
+        if not merged:
+            passages.append({"page": page, "pages": {page}, "edition": edition, "section": section_label(doc.metadata),
+                             "text": text, "rank": rank, "chunks": 1})
+
+    # a merge can make two earlier passages overlap (chunks arriving as 1, 3, 2), repeat until stable
+    changed = True
+    while changed:
+        changed = False
+        for i, first in enumerate(passages):
+            for second in passages[i + 1:]:
+                if first["page"] != second["page"] or first["edition"] != second["edition"]:
+                    continue
+                joined = merge_overlapping(first["text"], second["text"]) or merge_overlapping(second["text"], first["text"])
+                if joined is not None:
+                    first["text"] = joined
+                    first["chunks"] += second["chunks"]
+                    first["rank"] = min(first["rank"], second["rank"])
+                    passages.remove(second)
+                    changed = True
+                    break
+            if changed:
+                break
+
+    # 2. drop passages repeated verbatim inside a better-ranked one (e.g. on another page),
+    # text unchanged between editions is kept so each edition stays cited
+    passages.sort(key=lambda passage: passage["rank"])
+    unique = []
+    for passage in passages:
+        container = next((kept for kept in unique
+                          if kept["edition"] == passage["edition"] and passage["text"] in kept["text"]), None)
+        if container is not None:
+            container["pages"].add(passage["page"])
+            container["chunks"] += passage["chunks"]
+        else:
+            unique.append(passage)
+
+    # 3. pack the budget in rank order
+    blocks, pages, sections, editions, used_tokens, used_chunks = [], [], [], [], 0, 0
+    for passage in unique:
+        header = f"Source ({citation_label(passage)}):\n" if with_citations else ""
+        remaining = token_budget - used_tokens - estimate_tokens(header + "\n\n")
+        if remaining <= 0:
+            break
+        text = passage["text"]
+        if estimate_tokens(text) > remaining:
+            # only worth including a truncated passage if a reasonable amount fits
+            if remaining < 64:
+                break
+            text = truncate_to_tokens(text, remaining)
+        block = header + text
+        blocks.append(block)
+        pages.extend(sorted(passage["pages"], key=page_sort_key))
+        if passage["section"] and passage["section"] not in sections:
+            sections.append(passage["section"])
+        if passage["edition"] and passage["edition"] not in editions:
+            editions.append(passage["edition"])
+        used_tokens += estimate_tokens(block) + 1
+        used_chunks += passage["chunks"]
+
+    context = "\n\n".join(blocks)
+    return {
+        "context": context,
+        "context_tokens": estimate_tokens(context),
+        "pages": pages,
+        "sections": sections,
+        "editions": editions,
+        "chunks_used": used_chunks,
+        "chunks_retrieved": len(documents),
+    }
@@ -0,0 +1,94 @@
+# registry of network statement editions, each one ingested into its own chroma collection
+import json
+import os
+
+# without a registry file there is one edition, stored where the single-edition store always was
+default_registry = {
+    "default": ["2026"],
+    "editions": {
+        "2026": {"pdf": "NetworkStatement2026.pdf", "label": "Network Statement 2026", "directory": "."},
+    },
+}
+
+class Edition:
+    """
+    One edition: its pdf, its chroma collection and the directory holding its manifest,
+    keyword, section and flat indexes and page store. Every edition's collection lives
+    in the same chroma database, so editions are ingested and rebuilt independently.
+    """
+
+    def __init__(self, name, pdf_path, db_location, label=None, collection_name=None, directory=None):
+        self.name = name
+        self.pdf_path = pdf_path
+        self.label = label or f"Network Statement {name}"
+        self.collection_name = collection_name or f"network_statement_{name}"
+        if directory is None:
+            directory = os.path.join("editions", name)
+        self.directory = os.path.normpath(os.path.join(db_location, directory))
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, "ingest_manifest.json")
+
+    @property
+    def keyword_index_path(self):
+        return os.path.join(self.directory, "keyword_index.json")
+
+    @property
+    def section_index_path(self):
+        return os.path.join(self.directory, "section_index.json")
+
+    @property
+    def flat_index_path(self):
+        return os.path.join(self.directory, "flat_index")
+
+    @property
+    def page_store_location(self):
+        return os.path.join(self.directory, "pages")
+
+    def describe(self):
+        return {"name": self.name, "label": self.label, "pdf": self.pdf_path, "collection": self.collection_name}
+
+def load_registry(path, db_location):
+    """
+    (editions by name, default edition names) from a json registry file, or the single
+    2026 edition when there is no file. The file looks like
+
+        {"default": ["2026"],
+         "editions": {"2025": {"pdf": "NetworkStatement2025.pdf"},
+                      "2026": {"pdf": "NetworkStatement2026.pdf", "directory": "."},
+                      "2027": {"pdf": "NetworkStatement2027.pdf", "label": "Network Statement 2027 (draft)"}}}
+
+    where "label", "collection" and "directory" (relative to the db location) are optional.
+    """
+    registry = default_registry
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            registry = json.load(f)
+    editions = {}
+    for name, entry in registry.get("editions", {}).items():
+        name = str(name)
+        editions[name] = Edition(name, entry["pdf"], db_location, label=entry.get("label"),
+                                 collection_name=entry.get("collection"), directory=entry.get("directory"))
+    if not editions:
+        raise ValueError(f"edition registry {path} lists no editions")
+    defaults = [str(name) for name in registry.get("default") or list(editions)[-1:]]
+    unknown = [name for name in defaults if name not in editions]
+    if unknown:
+        raise ValueError(f"edition registry {path}: unknown default edition(s) {', '.join(unknown)}")
+    return editions, defaults
+
+def parse_editions(value, editions):
+    """
+    edition names from a list or a comma separated string, validated against the registry;
+    None (or empty) for the default selection
+    """
+    if value is None:
+        return None
+    names = value.split(",") if isinstance(value, str) else list(value)
+    names = [str(name).strip() for name in names if str(name).strip()]
+    unknown = [name for name in names if name not in editions]
+    if unknown:
+        raise ValueError(f"unknown edition(s) {', '.join(unknown)}, available: {', '.join(editions)}")
+    # keep the order given, once each
+    return list(dict.fromkeys(names)) or None
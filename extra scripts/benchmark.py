@@ -0,0 +1,284 @@
+"""
+Offline benchmark of the RAG pipeline against a local fake Ollama (see fake_ollama.py).
+
+Builds a temporary vector store from a deterministic synthetic corpus, then measures
+end-to-end and per-stage latency (retrieve, context format, llm, fix_mermaid_syntax) for
+main.py's q&a path, bpmn_generator.generate_bpmn_from_description and the flask
+endpoints at several concurrency levels. Results are written as json so runs on
+different commits can be compared with --compare.
+
+Usage (from the project root):
+    python "extra scripts/benchmark.py" --tokens-per-sec 100 --concurrency 1 2 4
+    python "extra scripts/benchmark.py" --compare "extra scripts/benchmark_results/abc1234.json"
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+sys.path.append(script_dir)
+
+from fake_ollama import serve
+
+results_dir = os.path.join(script_dir, "benchmark_results")
+
+vocabulary = (
+    "path allocation capacity request timetable railway undertaking ProRail network statement "
+    "freight passenger track access agreement safety certificate operating licence insurance "
+    "coordination conflict incidental TCR TTR ATB ERTMS station yard shunting charges minimum "
+    "access package deadline annual ad hoc request infrastructure manager maintenance works "
+    "possession route section corridor border crossing traffic control punctuality"
+).split()
+
+qa_questions = [
+    "What documents must a railway undertaking hold to operate on the network?",
+    "How do I submit a capacity request for a train path?",
+    "What is the deadline for path requests for the annual timetable?",
+    "What are the different categories of incidental TCRs?",
+    "What charges apply to the minimum access package?",
+    "Is passenger transport allowed on the freight tracks?",
+]
+
+bpmn_descriptions = [
+    "First, the system receives a request for a new train path. Then, it checks for any conflicting "
+    "requests in the timetable. If there are no conflicts, the path is allocated. If there are "
+    "conflicts, a coordination process is initiated.",
+    "A railway undertaking applies for an access agreement, ProRail checks the safety certificate "
+    "and operating licence, and if both are valid the agreement is signed.",
+]
+
+def synthetic_pages(n_pages, seed=42):
+    """deterministic pseudo network statement pages built from railway vocabulary"""
+    from langchain_core.documents import Document
+    rng = random.Random(seed)
+    pages = []
+    for page in range(n_pages):
+        sentences = []
+        for _ in range(rng.randint(20, 40)):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(8, 16))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        text = f"{page // 10 + 1}.{page % 10 + 1} Section heading\n" + " ".join(sentences)
+        pages.append(Document(page_content=text, metadata={"source": "synthetic.pdf", "page": page}))
+    return pages
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples_ms):
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.mean(samples_ms), 2),
+        "p50_ms": round(percentile(samples_ms, 0.50), 2),
+        "p95_ms": round(percentile(samples_ms, 0.95), 2),
+        "max_ms": round(max(samples_ms), 2),
+    }
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def build_store(n_pages):
+    """embeds the synthetic corpus into the (temporary) store and builds the keyword and section indexes"""
+    import railway_vector
+    from langchain_core.documents import Document
+    from sections import SectionTracker
+    vector_store = railway_vector.get_vector_store()
+    # split at the section headings like iter_pdf_chunks does, so the chunks carry section metadata
+    sections = SectionTracker()
+    segments = [Document(page_content=text, metadata={**page.metadata, **section})
+                for page in synthetic_pages(n_pages) for section, text in sections.split_page(page.page_content)]
+    chunks = railway_vector.text_splitter.split_documents(segments)
+    pairs = list(railway_vector.iter_chunk_ids(chunks))
+    for start in range(0, len(pairs), 64):
+        batch = pairs[start:start + 64]
+        vector_store.add_documents([chunk for _, chunk in batch], ids=[cid for cid, _ in batch])
+    railway_vector.build_keyword_index(vector_store)
+    railway_vector.build_section_index(vector_store)
+    return len(pairs)
+
+def bench_main_qa(iterations):
+    """main.py q&a path, stage by stage"""
+    import main
+    from railway_vector import get_retriever
+    from context_builder import assemble_context
+    stages = {"retrieve": [], "context_format": [], "llm": [], "end_to_end": []}
+    for i in range(iterations):
+        question = qa_questions[i % len(qa_questions)]
+        # the uncached retriever: the questions repeat, a cache hit would hide the retrieval cost
+        docs, retrieve_ms = timed(get_retriever().inner.invoke, question)
+        assembled, format_ms = timed(assemble_context, docs)
+        _, llm_ms = timed(main.qa_chain.invoke, {"context": assembled["context"], "question": question})
+        stages["retrieve"].append(retrieve_ms)
+        stages["context_format"].append(format_ms)
+        stages["llm"].append(llm_ms)
+        stages["end_to_end"].append(retrieve_ms + format_ms + llm_ms)
+    return {stage: summarize(samples) for stage, samples in stages.items()}
+
+def bench_bpmn(iterations):
+    """bpmn_generator: per stage, plus the public function end to end"""
+    import main
+    import bpmn_generator
+    from railway_vector import get_retriever
+    stages = {"retrieve": [], "context_format": [], "llm": [], "fix_mermaid_syntax": [], "end_to_end": []}
+    chain = bpmn_generator.bpmn_prompt | main.model
+    for i in range(iterations):
+        description = bpmn_descriptions[i % len(bpmn_descriptions)]
+        # the uncached retriever: the questions repeat, a cache hit would hide the retrieval cost
+        docs, retrieve_ms = timed(get_retriever().inner.invoke, description)
+        context, format_ms = timed(bpmn_generator.bpmn_format_context, docs)
+        response, llm_ms = timed(chain.invoke, {"regulatory_context": context, "process_description": description})
+        _, fix_ms = timed(bpmn_generator.extract_mermaid, response)
+        _, total_ms = timed(bpmn_generator.generate_bpmn_from_description, description, main.model)
+        stages["retrieve"].append(retrieve_ms)
+        stages["context_format"].append(format_ms)
+        stages["llm"].append(llm_ms)
+        stages["fix_mermaid_syntax"].append(fix_ms)
+        stages["end_to_end"].append(total_ms)
+    return {stage: summarize(samples) for stage, samples in stages.items()}
+
+def check_endpoints():
+    """
+    the non-generating endpoints the web interface depends on, through the (caching)
+    shared retriever; exits with an error instead of benchmarking a broken app
+    """
+    import api_server
+    client = api_server.app.test_client()
+    response = client.get("/api/sections")
+    sections = response.get_json().get("sections") if response.status_code == 200 else None
+    if not sections:
+        sys.exit(f"/api/sections returned {response.status_code} {response.get_data(as_text=True)!r}, expected sections")
+    question = {"question": qa_questions[0]}
+    first, second = (client.post("/api/retrieve", json=question) for _ in range(2))
+    if first.status_code != 200 or not first.get_json()["chunks"]:
+        sys.exit(f"/api/retrieve returned {first.status_code} {first.get_data(as_text=True)!r}, expected chunks")
+    if not second.get_json()["cached"]:
+        sys.exit("/api/retrieve missed the retrieval cache on a repeated question")
+    print(f"endpoint check: {len(sections)} sections, /api/retrieve cached on repeat")
+
+def bench_endpoints(concurrency_levels, requests_per_worker):
+    """flask endpoints through the test client, n concurrent clients per level"""
+    import api_server
+    results = {}
+    cases = {
+        "/api/qa": lambda i: {"question": f"{qa_questions[i % len(qa_questions)]} (variant {i})"},
+        "/api/bpmn": lambda i: {"description": f"{bpmn_descriptions[i % len(bpmn_descriptions)]} Variant {i}."},
+    }
+    for path, body_for in cases.items():
+        results[path] = {}
+        for concurrency in concurrency_levels:
+            total = concurrency * requests_per_worker
+            statuses = []
+
+            def one_request(i):
+                client = api_server.app.test_client()
+                response, elapsed_ms = timed(client.post, path, json=body_for(i))
+                statuses.append(response.status_code)
+                return elapsed_ms
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(one_request, range(total)))
+            wall_s = time.perf_counter() - started
+            results[path][str(concurrency)] = {
+                **summarize(latencies),
+                "throughput_rps": round(total / wall_s, 3),
+                "errors": sum(1 for status in statuses if status != 200),
+            }
+            print(f"{path} concurrency {concurrency}: p50 {results[path][str(concurrency)]['p50_ms']:.0f} ms, "
+                  f"{results[path][str(concurrency)]['throughput_rps']:.2f} req/s")
+    return results
+
+def compare(current, baseline_path):
+    """prints p50 changes of every measured stage against a saved result file"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline.get('commit')} ({baseline_path}):")
+
+    def walk(new, old, prefix=""):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict) and "p50_ms" in value:
+                before, after = old[key]["p50_ms"], value["p50_ms"]
+                change = (after - before) / before * 100 if before else 0.0
+                print(f"  {prefix}{key}: p50 {before:.1f} -> {after:.1f} ms ({change:+.1f}%)")
+            elif isinstance(value, dict):
+                walk(value, old[key], f"{prefix}{key} ")
+
+    walk(current["results"], baseline["results"])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="synthetic corpus size")
+    parser.add_argument("--iterations", type=int, default=6, help="runs per stage benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="endpoint concurrency levels")
+    parser.add_argument("--requests-per-worker", type=int, default=2, help="endpoint requests per concurrent client")
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0, help="fake generation speed")
+    parser.add_argument("--prompt-tokens-per-sec", type=float, default=2000.0, help="fake prompt processing speed")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0, help="fake latency per embedding request")
+    parser.add_argument("--output", help="result file (default: extra scripts/benchmark_results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    server, base_url, fake = serve(tokens_per_sec=args.tokens_per_sec,
+                                   prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+                                   embed_latency_ms=args.embed_latency_ms)
+    store_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    # must be set before the app modules are imported: they read these at import time
+    os.environ["OLLAMA_HOST"] = base_url
+    os.environ["RAG_DB_LOCATION"] = store_dir
+    os.environ["RAG_ANSWER_CACHE"] = "0"
+    os.environ["RAG_BPMN_CACHE"] = "0"
+    os.chdir(project_root)
+
+    print(f"fake ollama at {base_url}, temporary store in {store_dir}")
+    n_chunks, ingest_ms = timed(build_store, args.pages)
+    print(f"ingested {n_chunks} chunks in {ingest_ms / 1000:.1f}s")
+
+    results = {"ingest": {"chunks": n_chunks, "total_ms": round(ingest_ms, 1)}}
+    results["main_qa"] = bench_main_qa(args.iterations)
+    print(f"main q&a end to end p50: {results['main_qa']['end_to_end']['p50_ms']:.0f} ms")
+    results["bpmn"] = bench_bpmn(args.iterations)
+    print(f"bpmn end to end p50: {results['bpmn']['end_to_end']['p50_ms']:.0f} ms")
+    check_endpoints()
+    results["endpoints"] = bench_endpoints(args.concurrency, args.requests_per_worker)
+    server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "ollama_requests": fake.requests,
+        "results": results,
+    }
+    output = args.output or os.path.join(results_dir, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results saved to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
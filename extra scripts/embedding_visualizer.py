@@ -1,97 +1,213 @@
+"""
+Corpus inspection: a 2-D map of the chunk embeddings already stored in Chroma.
+
+The embeddings are read from the collection in bulk pages (nothing is re-embedded,
+only the optional query is). A random sample is reduced with PCA first (randomized
+SVD, or incremental PCA for very large samples), and t-SNE or UMAP then only runs on
+the PCA output, so a few thousand chunks take seconds instead of minutes. Points are
+colored by page, section or chapter.
+
+With --query the query is embedded once and drawn as a star. The chunks the real
+retriever returns for it are circled in red, and the top-k chunks by plain cosine
+similarity that the retriever did not return are marked with an orange cross, so a
+retrieval miss can be told apart from a vocabulary or chunking problem. Retrieved and
+nearest chunks are always kept in the sample.
+
+Needs a populated store (run railway_vector.py first), matplotlib and scikit-learn;
+--method umap also needs umap-learn.
+
+Usage (from the project root):
+    python "extra scripts/embedding_visualizer.py" --color section --output corpus.png
+    python "extra scripts/embedding_visualizer.py" --query "How do I apply for capacity?" --method tsne
+    python "extra scripts/embedding_visualizer.py" --edition 2025 --sample 0 --method pca --color page
+"""
+import argparse
+import os
+import sys
+import time
+
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
-from langchain_ollama import OllamaEmbeddings
-import pandas as pd
-
-def get_embedding(text, embeddings_model):
-    """Get embedding for a single text"""
-    return embeddings_model.embed_query(text)
-
-def cosine_similarity(vec1, vec2):
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-
-def visualize_embeddings(texts, labels, title):
-    """Visualize embeddings using t-SNE"""
-    # Initialize embeddings model
-    embeddings = OllamaEmbeddings(model="mxbai-embed-large")
-    
-    # Get embeddings for all texts
-    print("Generating embeddings...")
-    embeddings_list = [get_embedding(text, embeddings) for text in texts]
-    
-    # Convert to numpy array
-    embeddings_array = np.array(embeddings_list)
-    
-    # Print cosine similarities between original and all others
-    print("\nCosine similarities to Original:")
-    for i, label in enumerate(labels):
-        if label == "Original":
-            continue
-        sim = cosine_similarity(embeddings_array[0], embeddings_array[i])
-        print(f"Original <-> {label}: {sim:.4f}")
-    
-    n_samples = len(texts)
-    perplexity = min(30, n_samples - 1)  # t-SNE requires perplexity < n_samples
-    
-    print(f"Applying t-SNE with perplexity={perplexity}...")
-    tsne = TSNE(n_components=2, random_state=42, perplexity=perplexity)
-    embeddings_2d = tsne.fit_transform(embeddings_array)
-    
-    # Create plot
-    plt.figure(figsize=(12, 8))
-    
-    # Plot points with different colors for original/modified vs others
-    colors = ['red' if label in ['Original', 'Modified'] else 'blue' for label in labels]
-    sizes = [100 if label in ['Original', 'Modified'] else 50 for label in labels]
-    
-    plt.scatter(embeddings_2d[:, 0], embeddings_2d[:, 1], c=colors, s=sizes, alpha=0.6)
-    
-    # Add labels with arrows
-    for i, label in enumerate(labels):
-        plt.annotate(label, 
-                    (embeddings_2d[i, 0], embeddings_2d[i, 1]),
-                    xytext=(5, 5),
-                    textcoords='offset points',
-                    bbox=dict(facecolor='white', edgecolor='none', alpha=0.7))
-    
-    # Add distance line between original and modified
-    orig_idx = labels.index('Original')
-    mod_idx = labels.index('Modified')
-    plt.plot([embeddings_2d[orig_idx, 0], embeddings_2d[mod_idx, 0]],
-             [embeddings_2d[orig_idx, 1], embeddings_2d[mod_idx, 1]],
-             'k--', alpha=0.3)
-    
-    # Calculate and display the distance
-    distance = np.linalg.norm(embeddings_2d[orig_idx] - embeddings_2d[mod_idx])
-    plt.title(f"{title}\nDistance between Original and Modified: {distance:.2f}")
-    
-    plt.grid(True, alpha=0.3)
-    plt.show()
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import railway_vector
+from flat_index import normalize_rows
+
+# rows per chroma get() call, keeps a single response to a few tens of megabytes
+read_page_size = 5000
+# above this many rows PCA runs incrementally in batches instead of on the whole matrix at once
+incremental_pca_rows = 50000
+
+def read_collection(vector_store):
+    """every stored chunk id, embedding and metadata, read in pages"""
+    collection = vector_store._collection
+    total = collection.count()
+    ids, embeddings, metadatas = [], [], []
+    for offset in range(0, total, read_page_size):
+        page = collection.get(include=["embeddings", "metadatas"], limit=read_page_size, offset=offset)
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+    return ids, np.asarray(embeddings, dtype=np.float32), metadatas
+
+def sample_rows(n_rows, size, keep, seed):
+    """a sorted random sample of row numbers that always contains the rows in `keep`"""
+    if not size or size >= n_rows:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(seed)
+    keep = np.asarray(sorted(keep), dtype=np.int64)
+    rest = np.setdiff1d(np.arange(n_rows), keep)
+    chosen = rng.choice(rest, size=max(0, size - len(keep)), replace=False)
+    return np.sort(np.concatenate([keep, chosen]))
+
+def reduce(matrix, method, pca_dims, seed):
+    """2-D coordinates: pca straight to 2-D, or pca to `pca_dims` followed by t-SNE/UMAP"""
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    n_components = 2 if method == "pca" else min(pca_dims, matrix.shape[0], matrix.shape[1])
+    started = time.perf_counter()
+    if matrix.shape[0] > incremental_pca_rows:
+        reduced = IncrementalPCA(n_components=n_components, batch_size=max(1000, n_components * 5)).fit_transform(matrix)
+    else:
+        reduced = PCA(n_components=n_components, svd_solver="randomized", random_state=seed).fit_transform(matrix)
+    print(f"pca to {n_components} dims in {time.perf_counter() - started:.2f}s")
+    if method == "pca":
+        return reduced
+
+    started = time.perf_counter()
+    if method == "umap":
+        try:
+            import umap
+        except ImportError:
+            sys.exit("--method umap needs umap-learn (pip install umap-learn), or use --method tsne")
+        coords = umap.UMAP(n_components=2, metric="cosine", random_state=seed).fit_transform(reduced)
+    else:
+        from sklearn.manifold import TSNE
+        perplexity = min(30, max(2, reduced.shape[0] - 1))  # t-SNE requires perplexity < n_samples
+        coords = TSNE(n_components=2, perplexity=perplexity, init="pca", random_state=seed).fit_transform(reduced)
+    print(f"{method} on {reduced.shape[0]} points in {time.perf_counter() - started:.2f}s")
+    return coords
+
+def color_values(metadatas, color_by):
+    """(values for scatter, categorical legend labels or None); pages get a continuous colormap"""
+    if color_by == "page":
+        return np.array([metadata.get("page", -1) for metadata in metadatas], dtype=float), None
+    key = "section_id" if color_by == "section" else "chapter"
+    labels = [str(metadata.get(key) or "none") for metadata in metadatas]
+    categories = sorted(set(labels), key=label_sort_key)
+    positions = {label: number for number, label in enumerate(categories)}
+    return np.array([positions[label] for label in labels], dtype=float), categories
+
+def label_sort_key(label):
+    """numeric section order ("2.10" after "2.9"), chunks outside any section last"""
+    try:
+        return (0, tuple(int(part) for part in label.split(".")))
+    except ValueError:
+        return (1, ())
+
+def chunk_summary(metadata):
+    section = metadata.get("section_id")
+    return f"page {metadata.get('page', '?')}" + (f", section {section} {metadata.get('section_title', '')}".rstrip() if section else "")
 
 def main():
-    # Load some reviews from the CSV
-    df = pd.read_csv("realistic_restaurant_reviews.csv")
-    # Randomly select 5 reviews
-    sample_reviews = df.sample(n=5)["Review"].tolist()
-    # Use the first review for user modification
-    original_review = sample_reviews[0]
-    print("\nOriginal Review:")
-    print(original_review)
-    print("\nPlease enter your modified version of the review (or press Enter to keep it the same):")
-    user_modified = input()
-    if not user_modified.strip():
-        user_modified = original_review
-    print("\nModified Review:")
-    print(user_modified)
-    print("\nOther Reviews:")
-    for i, review in enumerate(sample_reviews[1:], 1):
-        print(f"\nOther {i}:", review)
-    all_texts = [original_review, user_modified] + sample_reviews[1:]
-    labels = ["Original", "Modified"] + [f"Other {i+1}" for i in range(len(sample_reviews)-1)]
-    visualize_embeddings(all_texts, labels, "Embedding Comparison: Original vs Modified Review")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edition", default=None, help="edition whose collection is shown (default: the default edition)")
+    parser.add_argument("--sample", type=int, default=3000, help="chunks to plot, 0 for all")
+    parser.add_argument("--method", choices=("pca", "tsne", "umap"), default="tsne", help="final 2-D reduction")
+    parser.add_argument("--pca-dims", type=int, default=50, help="pca dimensions before t-SNE/UMAP")
+    parser.add_argument("--color", choices=("page", "section", "chapter"), default="chapter")
+    parser.add_argument("--query", help="embed this query and show where it lands and what it retrieves")
+    parser.add_argument("--k", type=int, default=5, help="chunks retrieved for --query")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="save the figure to this file instead of opening a window")
+    args = parser.parse_args()
+
+    os.chdir(project_root)
+    edition = railway_vector.get_edition(args.edition)
+    vector_store = railway_vector.get_vector_store(edition.name)
+    started = time.perf_counter()
+    ids, matrix, metadatas = read_collection(vector_store)
+    if not ids:
+        sys.exit(f"the {edition.label} collection is empty, run railway_vector.py first")
+    print(f"read {len(ids)} embeddings x {matrix.shape[1]} dims from {edition.collection_name} "
+          f"in {time.perf_counter() - started:.2f}s")
+    positions = {cid: row for row, cid in enumerate(ids)}
+    matrix = normalize_rows(matrix)
+
+    query_vector, retrieved_rows, nearest_rows = None, [], []
+    if args.query:
+        retriever = railway_vector.get_retriever()
+        embedding = retriever.embed_query(args.query)
+        query_vector = normalize_rows(np.asarray([embedding], dtype=np.float32))
+        similarities = matrix @ query_vector[0]
+        nearest_rows = [int(row) for row in np.argsort(-similarities)[:args.k]]
+        # the embedding is reused unless the retriever would answer from the keyword index alone
+        retrieved = retriever.invoke(args.query, k=args.k, editions=[edition.name],
+                                     embedding=embedding if retriever.wants_embedding(args.query, [edition.name]) else None)
+        retrieved_rows = [positions[cid] for cid in map(railway_vector.doc_chunk_id, retrieved) if cid in positions]
+
+        print(f"\nretrieved for {args.query!r}:")
+        for rank, row in enumerate(retrieved_rows, 1):
+            print(f"  {rank}. cosine {similarities[row]:.3f}  {chunk_summary(metadatas[row])}")
+        missed = [row for row in nearest_rows if row not in retrieved_rows]
+        if missed:
+            print("nearest by cosine but not retrieved:")
+            for row in missed:
+                print(f"     cosine {similarities[row]:.3f}  {chunk_summary(metadatas[row])}")
+
+    rows = sample_rows(len(ids), args.sample, set(retrieved_rows) | set(nearest_rows), args.seed)
+    points = matrix[rows]
+    if query_vector is not None:
+        # t-SNE has no transform for new points, so the query is part of the fit
+        points = np.vstack([points, query_vector])
+    print(f"\nplotting {len(rows)} of {len(ids)} chunks")
+    coords = reduce(points, args.method, args.pca_dims, args.seed)
+    chunk_coords = coords[:len(rows)]
+
+    import matplotlib
+    if args.output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    sampled_metadatas = [metadatas[row] for row in rows]
+    values, categories = color_values(sampled_metadatas, args.color)
+    figure, axes = plt.subplots(figsize=(13, 9))
+    cmap = "viridis" if categories is None else "tab20"
+    scatter = axes.scatter(chunk_coords[:, 0], chunk_coords[:, 1], c=values, cmap=cmap, s=6, alpha=0.6,
+                           linewidths=0, rasterized=True)
+    handles = []
+    if categories is None:
+        figure.colorbar(scatter, ax=axes, label="page")
+    elif len(categories) <= 20:
+        handles = [plt.Line2D([], [], marker="o", linestyle="", color=scatter.cmap(scatter.norm(number)),
+                              label=f"{args.color} {label}") for number, label in enumerate(categories)]
+
+    if query_vector is not None:
+        sampled_position = {row: number for number, row in enumerate(rows)}
+        retrieved_points = chunk_coords[[sampled_position[row] for row in retrieved_rows]]
+        missed_points = chunk_coords[[sampled_position[row] for row in nearest_rows if row not in retrieved_rows]]
+        handles.append(axes.scatter(retrieved_points[:, 0], retrieved_points[:, 1], s=80, facecolors="none",
+                                    edgecolors="red", linewidths=1.5, label="retrieved"))
+        if len(missed_points):
+            handles.append(axes.scatter(missed_points[:, 0], missed_points[:, 1], s=60, marker="x", color="orange",
+                                        label="nearest by cosine, not retrieved"))
+        handles.append(axes.scatter(coords[-1, 0], coords[-1, 1], s=250, marker="*", color="black", label="query"))
+        for rank, point in enumerate(retrieved_points, 1):
+            axes.annotate(str(rank), point, xytext=(4, 4), textcoords="offset points", fontsize=8, color="red")
+    if handles:
+        axes.legend(handles=handles, fontsize="small", loc="best")
+
+    axes.set_title(f"{edition.label}: {len(rows)} chunks, {args.method}, colored by {args.color}"
+                   + (f"\nquery: {args.query}" if args.query else ""))
+    axes.set_xticks([])
+    axes.set_yticks([])
+    figure.tight_layout()
+    if args.output:
+        figure.savefig(args.output, dpi=150)
+        print(f"saved {args.output}")
+    else:
+        plt.show()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
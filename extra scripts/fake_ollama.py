@@ -0,0 +1,223 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks that must not depend on a live model.
+
+- /api/embed and /api/embeddings return deterministic feature-hashed vectors, so texts that
+  share words are similar and retrieval behaves sensibly
+- /api/generate and /api/chat return canned text (a Mermaid diagram when the prompt asks for
+  one), streamed at a fixed tokens/sec after a prompt-processing delay proportional to the
+  prompt length
+- /api/tags, /api/ps and /api/show answer like a server with both models pulled
+
+Run standalone:
+    python "extra scripts/fake_ollama.py" --port 11435 --tokens-per-sec 30
+then point the app at it with OLLAMA_HOST=http://127.0.0.1:11435
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+word_pattern = re.compile(r"[a-z0-9]+")
+
+canned_answer = (
+    "A railway undertaking must hold a valid operating licence, a valid safety certificate "
+    "and an Access Agreement with ProRail. Additional Context: capacity requests for the annual "
+    "timetable are submitted through the path allocation process. Source: Page 35, Page 37."
+)
+
+canned_mermaid = """```mermaid
+graph TD
+    Step1["Receive Request"] --> Step2{{Conflict?}}
+    Step2 --|Yes|--> Step3["Initiate Coordination"]
+    Step2 --|No|--> Step4["Allocate Path"]
+    Step3 --> Step5["Decide Allocation"]
+    Step5 --> Step4
+```"""
+
+def embed_text(text, dimensions):
+    """deterministic unit vector: each word adds a signed one-hot at a hashed position"""
+    vector = [0.0] * dimensions
+    for word in word_pattern.findall(text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        position = int.from_bytes(digest[:4], "little") % dimensions
+        vector[position] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+def split_tokens(text):
+    """rough tokens: words with their trailing whitespace"""
+    return re.findall(r"\S+\s*", text)
+
+class FakeOllama:
+    """the canned behaviour and its knobs, shared by all request handler threads"""
+
+    def __init__(self, dimensions=1024, tokens_per_sec=50.0, prompt_tokens_per_sec=2000.0,
+                 embed_latency_ms=5.0, models=("llama3.2:latest", "mxbai-embed-large:latest")):
+        self.dimensions = dimensions
+        self.tokens_per_sec = tokens_per_sec
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.embed_latency_ms = embed_latency_ms
+        self.models = list(models)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def completion_for(self, prompt):
+        return canned_mermaid if "mermaid" in prompt.lower() else canned_answer
+
+    def prompt_delay(self, prompt):
+        return (len(prompt) / 4) / self.prompt_tokens_per_sec if self.prompt_tokens_per_sec else 0.0
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None  # set by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self.fake.count()
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": name, "model": name, "size": 0} for name in self.fake.models]})
+        elif self.path == "/api/ps":
+            self.send_json({"models": [{"name": name, "model": name} for name in self.fake.models]})
+        elif self.path == "/api/version":
+            self.send_json({"version": "0.0.0-fake"})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_POST(self):
+        self.fake.count()
+        request = self.read_json()
+        if self.path == "/api/embed":
+            inputs = request.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep(self.fake.embed_latency_ms / 1000)
+            self.send_json({
+                "model": request.get("model"),
+                "embeddings": [embed_text(text, self.fake.dimensions) for text in inputs],
+            })
+        elif self.path == "/api/embeddings":
+            time.sleep(self.fake.embed_latency_ms / 1000)
+            self.send_json({"embedding": embed_text(request.get("prompt", ""), self.fake.dimensions)})
+        elif self.path == "/api/generate":
+            self.generate(request, request.get("prompt", ""), chat=False)
+        elif self.path == "/api/chat":
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            self.generate(request, prompt, chat=True)
+        elif self.path == "/api/show":
+            self.send_json({"modelfile": "", "parameters": "", "template": "", "details": {}, "model_info": {}})
+        else:
+            self.send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def chunk(self, request, text, chat, done, extra=None):
+        payload = {
+            "model": request.get("model"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done,
+        }
+        if chat:
+            payload["message"] = {"role": "assistant", "content": text}
+        else:
+            payload["response"] = text
+        payload.update(extra or {})
+        return payload
+
+    def generate(self, request, prompt, chat):
+        # an empty prompt is how clients load a model without generating anything
+        completion = self.fake.completion_for(prompt) if prompt else ""
+        tokens = split_tokens(completion)
+        started = time.perf_counter()
+        time.sleep(self.fake.prompt_delay(prompt))
+        final = {
+            "done_reason": "stop",
+            "prompt_eval_count": math.ceil(len(prompt) / 4),
+            "eval_count": len(tokens),
+        }
+        interval = 1.0 / self.fake.tokens_per_sec if self.fake.tokens_per_sec else 0.0
+
+        if not request.get("stream", True):
+            time.sleep(interval * len(tokens))
+            final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self.send_json(self.chunk(request, completion, chat, True, final))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(payload):
+            line = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        for token in tokens:
+            time.sleep(interval)
+            write(self.chunk(request, token, chat, False))
+        final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+        write(self.chunk(request, "", chat, True, final))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def serve(host="127.0.0.1", port=0, **options):
+    """starts the fake server on a background thread, returns (server, base_url, fake)"""
+    fake = FakeOllama(**options)
+    handler = type("FakeOllamaHandler", (Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", fake
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="generation speed")
+    parser.add_argument("--prompt-tokens-per-sec", type=float, default=2000.0, help="prompt processing speed")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0, help="fixed latency per embedding request")
+    parser.add_argument("--dimensions", type=int, default=1024, help="embedding size")
+    args = parser.parse_args()
+
+    server, base_url, _ = serve(args.host, args.port, dimensions=args.dimensions,
+                                tokens_per_sec=args.tokens_per_sec,
+                                prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+                                embed_latency_ms=args.embed_latency_ms)
+    print(f"fake ollama listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
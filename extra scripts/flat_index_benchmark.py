@@ -0,0 +1,132 @@
+"""
+Latency and recall of the flat (memory-mapped float16 / int8) vector backend against Chroma.
+
+Queries are the fixture questions (embedded through Ollama in one batched call) plus
+stored chunk embeddings with gaussian noise added, so the script also runs without
+Ollama (--no-fixture). Ground truth is exact float32 cosine search over the stored
+embeddings. For every backend it reports:
+- recall@k against that ground truth
+- overlap@k with Chroma's results
+- single-query latency
+- for the flat backends, batched latency per query, time to open the index and its size on disk
+
+Needs a populated store (run railway_vector.py first).
+
+Usage (from the project root):
+    python "extra scripts/flat_index_benchmark.py" --k 5 --sample 200
+    python "extra scripts/flat_index_benchmark.py" --no-fixture --sample 500 --json flat.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+import railway_vector
+from flat_index import FlatIndex, normalize_rows
+
+default_fixture = os.path.join(script_dir, "fixtures", "retrieval_questions.jsonl")
+
+def load_queries(args, matrix):
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    if not args.no_fixture:
+        with open(args.fixture, "r", encoding="utf-8") as f:
+            questions = [json.loads(line)["question"] for line in f if line.strip()]
+        queries.extend(railway_vector.get_embeddings().embed_documents(questions))
+    if args.sample:
+        rows = rng.choice(len(matrix), size=min(args.sample, len(matrix)), replace=False)
+        noisy = matrix[rows] + rng.normal(0, args.noise, size=(len(rows), matrix.shape[1]))
+        queries.extend(noisy.astype(np.float32))
+    return np.asarray(queries, dtype=np.float32)
+
+def exact_top_k(matrix, queries, k):
+    scores = normalize_rows(queries) @ normalize_rows(matrix).T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+def latency_summary(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+    }
+
+def evaluate(name, search, queries, truth, positions, reference=None):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        ids = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids)
+    recall = statistics.mean(len({positions[cid] for cid in ids} & expected) / len(expected)
+                             for ids, expected in zip(results, truth))
+    report = {"backend": name, "recall_at_k": round(recall, 4), **latency_summary(latencies)}
+    if reference is not None:
+        report["overlap_with_chroma"] = round(statistics.mean(
+            len(set(ids) & set(ref)) / max(1, len(ref)) for ids, ref in zip(results, reference)), 4)
+    return report, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fixture", default=default_fixture, help="jsonl file with questions")
+    parser.add_argument("--no-fixture", action="store_true", help="only use noisy stored embeddings as queries (no ollama)")
+    parser.add_argument("--sample", type=int, default=200, help="noisy stored embeddings used as extra queries")
+    parser.add_argument("--noise", type=float, default=0.02, help="standard deviation of the query noise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="optional path to save the results as json")
+    args = parser.parse_args()
+
+    os.chdir(project_root)
+    vector_store = railway_vector.get_vector_store()
+    stored = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    if not stored["ids"]:
+        sys.exit("the vector store is empty, run railway_vector.py first")
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    positions = {cid: row for row, cid in enumerate(stored["ids"])}
+    queries = load_queries(args, matrix)
+    truth = exact_top_k(matrix, queries, args.k)
+    print(f"{len(stored['ids'])} chunks x {matrix.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    chroma_report, chroma_results = evaluate(
+        "chroma", lambda q: [railway_vector.doc_chunk_id(doc) for doc in vector_store.similarity_search_by_vector(q.tolist(), k=args.k)],
+        queries, truth, positions)
+    reports = [chroma_report]
+
+    for dtype in FlatIndex.dtypes:
+        directory = tempfile.mkdtemp(prefix=f"flat_{dtype}_")
+        FlatIndex.build(stored["ids"], matrix, stored["documents"], stored["metadatas"], dtype=dtype).save(directory)
+        started = time.perf_counter()
+        index = FlatIndex.load(directory)
+        load_ms = (time.perf_counter() - started) * 1000
+        report, _ = evaluate(
+            f"flat-{dtype}", lambda q: [cid for cid, _ in index.search(q, args.k)],
+            queries, truth, positions, reference=chroma_results)
+        started = time.perf_counter()
+        index.search_batch(queries, args.k)
+        report["batch_ms_per_query"] = round((time.perf_counter() - started) * 1000 / len(queries), 3)
+        report["load_ms"] = round(load_ms, 2)
+        report["size_mb"] = round(sum(os.path.getsize(os.path.join(directory, name))
+                                      for name in os.listdir(directory)) / 1e6, 2)
+        reports.append(report)
+
+    for report in reports:
+        extras = ", ".join(f"{key} {value}" for key, value in report.items()
+                           if key not in ("backend", "recall_at_k", "median_ms", "p95_ms"))
+        print(f"{report['backend']:>13}: recall@{args.k} {report['recall_at_k']:.3f}, "
+              f"median {report['median_ms']:.2f} ms, p95 {report['p95_ms']:.2f} ms" + (f", {extras}" if extras else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"chunks": len(stored["ids"]), "queries": len(queries), "k": args.k, "results": reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Fuzz/property checks and throughput benchmark for mermaid_parser.py, which does the work behind
+bpmn_generator.fix_mermaid_syntax (imported directly so this runs without langchain).
+
+Properties checked on random diagrams written in the arrow/label styles LLMs produce, with
+and without random mutations (deleted/duplicated characters, prose lines, code-block braces):
+- the repairer never raises
+- repair is idempotent: repairing canonical output gives the same output
+- every output line is canonical mermaid (header, node definition, edge or style statement)
+- every edge of an unmutated diagram survives, whatever arrow style it was written in
+- no unconnected node definition is emitted when the diagram has edges
+
+Usage (from the project root):
+    python "extra scripts/mermaid_fuzz.py" --cases 2000 --seed 1
+    python "extra scripts/mermaid_fuzz.py" --cases 0 --sizes 100 1000 10000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_parser import repair_mermaid
+
+canonical_line = re.compile(
+    r'^(?:graph (?:TB|TD|BT|RL|LR)'
+    r'|    \w[\w.\-]*(?:\[\[|\(\[|\[\(|\(\(|\{\{|\[|\(|\{)"[^"]*"(?:\]\]|\]\)|\)\]|\)\)|\}\}|\]|\)|\})'
+    r'|    \w[\w.\-]* -->(?:\|[^|"]+\|)? \w[\w.\-]*'
+    r'|    (?:classDef|class|style|linkStyle) .+)$')
+
+shapes = [('["', '"]'), ('{{', '}}'), ('{', '}'), ('(', ')'), ('([', '])'), ('((', '))')]
+label_words = "receive request check conflict allocate path notify applicant coordinate decide yes no".split()
+
+def edge_text(source, target, label, rng):
+    """one edge in a randomly chosen (possibly wrong) llm style"""
+    if label is None:
+        arrow = rng.choice(["-->", "--->", "==>", "-.->", "->", "|>", ">", "---"])
+        return f"{source} {arrow} {target}"
+    style = rng.choice(["-->|{0}|", "--|{0}|-->", "--|{0}|>", "-- {0} -->", "-->|{0}|>"])
+    return f"{source} {style.format(label)} {target}"
+
+def random_diagram(rng, n_nodes):
+    """returns (mermaid text, expected edge set) for a random connected process"""
+    ids = [f"Step{i}" for i in range(1, n_nodes + 1)]
+    edges = set()
+    for i in range(1, n_nodes):
+        edges.add((ids[rng.randrange(i)], ids[i], rng.choice([None, None, "Yes", "No", "Approved"])))
+    lines = [rng.choice(["graph TD", "graph TD;", "flowchart LR", "```mermaid\ngraph TD"])]
+    defined = set()
+    for source, target, label in sorted(edges, key=lambda edge: rng.random()):
+        parts = []
+        for node in (source, target):
+            if node not in defined and rng.random() < 0.5:
+                opener, closer = rng.choice(shapes)
+                text = " ".join(rng.choice(label_words) for _ in range(rng.randint(1, 4)))
+                parts.append(f"{node}{opener}{text}{closer}")
+                defined.add(node)
+            else:
+                parts.append(node)
+        lines.append("    " + edge_text(parts[0], parts[1], label, rng))
+    if rng.random() < 0.3:
+        # chained statements on one line
+        lines.append("    " + "; ".join(edge_text(s, t, l, rng) for s, t, l in list(edges)[:3]))
+    return "\n".join(lines), {(s, t, l) for s, t, l in edges}
+
+def mutate(text, rng):
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        if not chars:
+            break
+        position = rng.randrange(len(chars))
+        operation = rng.random()
+        if operation < 0.3:
+            del chars[position]
+        elif operation < 0.6:
+            chars.insert(position, rng.choice('-|>[]{}()";:&\n "'))
+        else:
+            chars.insert(position, chars[position])
+    mutated = "".join(chars)
+    if rng.random() < 0.3:
+        mutated = "Here is the BPMN diagram:\n" + mutated + "\nif (conflict) {\n}\nThis diagram shows the process."
+    return mutated
+
+def check(text, expected_edges=None):
+    """returns a list of property violations for one input"""
+    failures = []
+    try:
+        graph = repair_mermaid(text)
+        output = graph.to_mermaid()
+    except Exception as e:
+        return [f"raised {type(e).__name__}: {e}"]
+    again = repair_mermaid(output).to_mermaid()
+    if again != output:
+        failures.append("not idempotent")
+    for line in output.splitlines():
+        if not canonical_line.match(line):
+            failures.append(f"non-canonical line: {line!r}")
+    if graph.edges:
+        connected = graph.connected_ids()
+        defined = re.findall(r'^    ([\w.\-]+)[\[({]', output, re.MULTILINE)
+        failures.extend(f"unconnected definition: {node_id}" for node_id in defined if node_id not in connected)
+    if expected_edges is not None:
+        found = {(edge.source, edge.target, edge.label) for edge in graph.edges}
+        missing = expected_edges - found
+        if missing:
+            failures.append(f"lost {len(missing)} edge(s), e.g. {sorted(missing, key=str)[0]}")
+    return failures
+
+def fuzz(cases, seed):
+    rng = random.Random(seed)
+    failed = 0
+    for case in range(cases):
+        text, expected = random_diagram(rng, rng.randint(2, 25))
+        mutated = case % 2 == 1
+        if mutated:
+            text = mutate(text, rng)
+        failures = check(text, None if mutated else expected)
+        if failures:
+            failed += 1
+            if failed <= 5:
+                print(f"case {case} ({'mutated' if mutated else 'clean'}): {'; '.join(failures[:3])}")
+                print("    input: " + text.replace("\n", "\n    input: "))
+    print(f"fuzz: {cases - failed}/{cases} cases passed")
+    return failed == 0
+
+def benchmark(sizes, repeats, seed):
+    rng = random.Random(seed)
+    for size in sizes:
+        text, _ = random_diagram(rng, size)
+        n_lines = text.count("\n") + 1
+        best = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            repair_mermaid(text).to_mermaid()
+            best = min(best, time.perf_counter() - started)
+        print(f"{size:>6} nodes, {n_lines:>6} lines: {best * 1000:8.1f} ms, {n_lines / best:>10,.0f} lines/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000, help="random diagrams to check (half of them mutated)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="benchmark diagram sizes (nodes)")
+    parser.add_argument("--repeats", type=int, default=3, help="benchmark runs per size (best is reported)")
+    args = parser.parse_args()
+
+    passed = fuzz(args.cases, args.seed) if args.cases else True
+    benchmark(args.sizes, args.repeats, args.seed)
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Offline recall/latency comparison of the retrieval modes on a fixture question set.
+
+A retrieved chunk counts as relevant when it contains one of the question's
+"expected" strings (case-insensitive). Recall@k is the share of questions with at
+least one relevant chunk in the top k. Needs a populated store and keyword index
+(run railway_vector.py first).
+
+Usage (from the project root):
+    python "extra scripts/retrieval_comparison.py" --k 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import railway_vector
+from railway_vector import RailwayRetriever, get_vector_store
+
+default_fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "retrieval_questions.jsonl")
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def is_relevant(doc, expected):
+    text = doc.page_content.lower()
+    return any(term.lower() in text for term in expected)
+
+def keyword_only(retriever, question, k):
+    hits = retriever.keyword_index.search(question, k)
+    return retriever.docs_by_ids([cid for cid, _ in hits])
+
+def evaluate(name, search, questions, k):
+    hits, latencies = 0, []
+    for item in questions:
+        started = time.perf_counter()
+        docs = search(item["question"], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if any(is_relevant(doc, item["expected"]) for doc in docs):
+            hits += 1
+    return {
+        "mode": name,
+        "recall_at_k": hits / len(questions),
+        "median_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default=default_fixture, help="jsonl file with question/expected pairs")
+    parser.add_argument("--k", type=int, default=5, help="chunks retrieved per question")
+    parser.add_argument("--json", help="optional path to save the results as json")
+    args = parser.parse_args()
+
+    os.chdir(project_root)
+    questions = load_questions(args.fixture)
+    vector_store = get_vector_store()
+    vector = RailwayRetriever(vector_store, k=args.k, mode="vector")
+    hybrid = RailwayRetriever(vector_store, k=args.k, mode="hybrid")
+    if hybrid.keyword_index is None:
+        sys.exit(f"no keyword index at {railway_vector.keyword_index_path}, run railway_vector.py first")
+
+    results = [
+        evaluate("vector", lambda q, k: vector.invoke(q, k=k), questions, args.k),
+        evaluate("bm25", lambda q, k: keyword_only(hybrid, q, k), questions, args.k),
+        evaluate("hybrid", lambda q, k: hybrid.invoke(q, k=k), questions, args.k),
+    ]
+    print(f"{len(questions)} questions, k={args.k}")
+    for result in results:
+        print(f"{result['mode']:>7}: recall@{args.k} {result['recall_at_k']:.2f}, "
+              f"median {result['median_ms']:.1f} ms, max {result['max_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
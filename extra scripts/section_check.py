@@ -0,0 +1,70 @@
+"""
+Regression checks for the heading detection in sections.py, on small hand-written pages
+shaped like the network statement: a table of contents, chapters with and without
+subsections, and numbered lists inside a section that must not be taken for chapters.
+
+Usage (from the project root):
+    python "extra scripts/section_check.py"
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sections import SectionTracker
+
+def labels(pages):
+    """(section_id, first line) for every segment, in document order"""
+    tracker = SectionTracker()
+    return [(metadata.get("section_id"), text.strip().splitlines()[0])
+            for page in pages for metadata, text in tracker.split_page(page)]
+
+cases = {
+    "numbered list inside a section": (
+        [
+            "1 GENERAL INFORMATION\nIntro text.\n1.1 Introduction\nThe applicant must:\n"
+            "1 Register with the infrastructure manager\n2 Sign the framework agreement\n"
+            "3 Access conditions\nare published yearly.\n",
+            "1.2 Purpose\nPurpose text.\n2 INFRASTRUCTURE\nChapter intro.\n2.1 Scope\nScope text.\n",
+        ],
+        [
+            ("1", "1 GENERAL INFORMATION"),
+            ("1.1", "1.1 Introduction"),
+            ("1.2", "1.2 Purpose"),
+            ("2", "2 INFRASTRUCTURE"),
+            ("2.1", "2.1 Scope"),
+        ],
+    ),
+    "chapter confirmed on the next page": (
+        ["1.1 Introduction\nText.\n2 INFRASTRUCTURE\nChapter intro.\n", "2.1 Scope\nScope text.\n"],
+        [("1.1", "1.1 Introduction"), ("2.1", "2.1 Scope")],
+    ),
+    "chapter without subsections listed in the table of contents": (
+        [
+            "Contents\n1 General information ........ 3\n2 Infrastructure 7\n3 Access conditions ..... 9\n",
+            "1 GENERAL INFORMATION\nText.\n1.1 Introduction\nText.\n2 INFRASTRUCTURE\nNo subsections.\n"
+            "3 ACCESS CONDITIONS\n3.1 Framework agreements\nText.\n",
+        ],
+        [
+            (None, "Contents"),
+            ("1", "1 GENERAL INFORMATION"),
+            ("1.1", "1.1 Introduction"),
+            ("2", "2 INFRASTRUCTURE"),
+            ("3", "3 ACCESS CONDITIONS"),
+            ("3.1", "3.1 Framework agreements"),
+        ],
+    ),
+}
+
+def main():
+    failed = 0
+    for name, (pages, expected) in cases.items():
+        got = labels(pages)
+        if got != expected:
+            failed += 1
+            print(f"{name}: expected {expected}, got {got}")
+    print(f"sections: {len(cases) - failed}/{len(cases)} cases passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures cold-start time of the retrieval layer.
+
+"before" reproduces what importing railway_vector used to cost: parsing and
+splitting the whole PDF, then opening the store. "after" is the current path:
+import railway_vector and build the retriever from the persistent store.
+Each scenario runs in a fresh interpreter so import caches don't hide anything.
+
+Usage (from the project root):
+    python "extra scripts/startup_benchmark.py" --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+scenarios = {
+    "before": """
+import time
+started = time.perf_counter()
+import railway_vector
+from langchain_community.document_loaders import PyPDFLoader
+documents = PyPDFLoader(railway_vector.pdf_path).load()
+chunks = railway_vector.text_splitter.split_documents(documents)
+railway_vector.get_retriever()
+print(time.perf_counter() - started)
+""",
+    "after": """
+import time
+started = time.perf_counter()
+import railway_vector
+railway_vector.get_retriever()
+print(time.perf_counter() - started)
+""",
+}
+
+def run_scenario(code):
+    """runs one scenario in a new python process and returns the measured seconds"""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="runs per scenario")
+    parser.add_argument("--json", help="optional path to save the results as json")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in scenarios.items():
+        timings = [run_scenario(code) for _ in range(args.runs)]
+        results[name] = {
+            "runs": timings,
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+        }
+        print(f"{name:>6}: median {results[name]['median_s']:.3f}s, min {results[name]['min_s']:.3f}s over {args.runs} runs")
+
+    speedup = results["before"]["median_s"] / results["after"]["median_s"]
+    print(f"cold start is {speedup:.1f}x faster without import-time pdf parsing")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
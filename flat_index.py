@@ -0,0 +1,138 @@
+# exact top-k search over a memory-mapped, quantized copy of the chunk embeddings
+import json
+import os
+
+import numpy as np
+
+vectors_name = "vectors.npy"
+table_name = "chunks.json"
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class FlatIndex:
+    """
+    Brute-force cosine search over every chunk embedding. The embeddings are stored
+    row-normalized as one float16 or int8 matrix and memory-mapped on load. For a
+    corpus of a few thousand chunks, a single matrix product is faster than going
+    through chroma's client and hnsw layer, and opening the index costs almost nothing.
+    Chunk ids, texts and metadata are kept in a json side table, so results need no
+    chroma call.
+
+    int8 rows are quantized with one scale per row (row ~= q * scale), and the scores
+    are rescaled after the product.
+    """
+
+    dtypes = ("float16", "int8")
+    # rows converted to float32 per step, bounds the temporary memory of a search
+    block_rows = 8192
+
+    def __init__(self, vectors, ids, texts, metadatas, scales=None):
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.scales = scales
+        self.positions = {cid: row for row, cid in enumerate(ids)}
+
+    @property
+    def dtype(self):
+        return str(self.vectors.dtype)
+
+    @classmethod
+    def build(cls, ids, embeddings, texts, metadatas, dtype="float16"):
+        if dtype not in cls.dtypes:
+            raise ValueError(f"unsupported flat index dtype {dtype!r}, use one of {', '.join(cls.dtypes)}")
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            # no chunks at all
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        matrix = normalize_rows(matrix)
+        scales = None
+        if dtype == "int8":
+            scales = np.abs(matrix).max(axis=1, initial=0.0)
+            scales[scales == 0] = 1.0
+            vectors = np.round(matrix / scales[:, None] * 127).astype(np.int8)
+            scales = (scales / 127).astype(np.float32)
+        else:
+            vectors = matrix.astype(np.float16)
+        return cls(vectors, list(ids), list(texts), [dict(metadata or {}) for metadata in metadatas], scales)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, queries, rows=None):
+        """
+        cosine scores of every query (rows of `queries`) against every chunk, shape (queries, chunks);
+        with `rows` only those matrix rows are read and scored, in that order
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        n_rows = len(self.ids) if rows is None else len(rows)
+        scores = np.empty((queries.shape[0], n_rows), dtype=np.float32)
+        for start in range(0, n_rows, self.block_rows):
+            if rows is None:
+                block = self.vectors[start:start + self.block_rows]
+            else:
+                block = self.vectors[rows[start:start + self.block_rows]]
+            scores[:, start:start + len(block)] = queries @ block.astype(np.float32).T
+        if self.scales is not None:
+            scores *= (self.scales if rows is None else self.scales[rows])[None, :]
+        return scores
+
+    def rows_for(self, ids):
+        """sorted matrix rows of the given chunk ids, for restricting a search"""
+        return np.array(sorted(self.positions[cid] for cid in ids if cid in self.positions), dtype=np.int64)
+
+    def search_batch(self, queries, k=5, rows=None):
+        """top k (chunk id, score) pairs for each query vector, best first, optionally only among `rows`"""
+        n_rows = len(self.ids) if rows is None else len(rows)
+        if n_rows == 0:
+            return [[] for _ in range(len(queries))]
+        scores = self.scores(queries, rows)
+        k = min(k, n_rows)
+        # argpartition finds the top k in linear time, only those k get sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            columns = ordered if rows is None else rows[ordered]
+            results.append([(self.ids[column], float(scores[row, index])) for column, index in zip(columns, ordered)])
+        return results
+
+    def search(self, query, k=5, rows=None):
+        return self.search_batch([query], k, rows)[0]
+
+    def records(self, ids):
+        """(id, text, metadata) for the given chunk ids that exist, in the given order"""
+        rows = [self.positions[cid] for cid in ids if cid in self.positions]
+        return [(self.ids[row], self.texts[row], self.metadatas[row]) for row in rows]
+
+    def save(self, directory):
+        """the matrix as .npy and the side table as json; the table is written last and marks the index complete"""
+        os.makedirs(directory, exist_ok=True)
+        vectors_path = os.path.join(directory, vectors_name)
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors))
+        os.replace(vectors_path + ".tmp", vectors_path)
+        table_path = os.path.join(directory, table_name)
+        with open(table_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "dtype": self.dtype,
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas,
+                "scales": self.scales.tolist() if self.scales is not None else None,
+            }, f)
+        os.replace(table_path + ".tmp", table_path)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, table_name), "r", encoding="utf-8") as f:
+            table = json.load(f)
+        vectors = np.load(os.path.join(directory, vectors_name), mmap_mode="r")
+        if vectors.shape[0] != len(table["ids"]):
+            raise ValueError(f"flat index in {directory} is inconsistent, rebuild it with railway_vector.py --flat-index-only")
+        scales = np.asarray(table["scales"], dtype=np.float32) if table.get("scales") is not None else None
+        return cls(vectors, table["ids"], table["texts"], table["metadatas"], scales)
@@ -1,22 +1,58 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import StatusModule from './StatusModule';
-import { GitBranch, Send, Download, Copy, Check, ExternalLink } from 'lucide-react';
-import axios from 'axios';
+import { GitBranch, Send, Download, Copy, Check, ExternalLink, RefreshCw, Link } from 'lucide-react';
+import { postEventStream } from '../streaming';
 
 function BPMNInterface() {
   const [description, setDescription] = useState('');
   const [mermaidScript, setMermaidScript] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [streamedText, setStreamedText] = useState('');
   const [copied, setCopied] = useState(false);
+  const [diagramId, setDiagramId] = useState('');
+  const [isCached, setIsCached] = useState(false);
+  const [linkCopied, setLinkCopied] = useState(false);
+  const [issues, setIssues] = useState([]);
 
-  const handleSubmit = async (e) => {
-    e.preventDefault();
+  const showDiagram = (data) => {
+    setMermaidScript(data.mermaid_script);
+    setDiagramId(data.diagram_id || '');
+    setIsCached(Boolean(data.cached));
+    setIssues(data.issues || []);
+  };
+
+  // shared links (?diagram=<id>) re-open a cached diagram without generating it again
+  useEffect(() => {
+    const sharedId = new URLSearchParams(window.location.search).get('diagram');
+    if (!sharedId) return;
+    fetch(`/api/bpmn/${encodeURIComponent(sharedId)}`)
+      .then(response => (response.ok ? response.json() : null))
+      .then(data => {
+        if (data) {
+          setDescription(data.description);
+          showDiagram(data);
+        }
+      })
+      .catch(error => console.error('Error:', error));
+  }, []);
+
+  const generate = async (forceRegenerate) => {
     if (!description.trim() || isLoading) return;
 
     setIsLoading(true);
+    setStreamedText('');
     try {
-      const response = await axios.post('/api/bpmn', { description });
-      setMermaidScript(response.data.mermaid_script);
+      // raw llm output streams in while generating, the cleaned-up script arrives last
+      const body = { description, force_regenerate: forceRegenerate };
+      await postEventStream('/api/bpmn/stream', body, (event, data) => {
+        if (event === 'token') {
+          setStreamedText(prev => prev + data.text);
+        } else if (event === 'mermaid') {
+          showDiagram(data);
+        } else if (event === 'error') {
+          throw new Error(data.error);
+        }
+      });
     } catch (error) {
       console.error('Error:', error);
       setMermaidScript('// Error: Could not generate BPMN diagram. Please make sure the backend is running.');
@@ -25,6 +61,22 @@ function BPMNInterface() {
     }
   };
 
+  const handleSubmit = (e) => {
+    e.preventDefault();
+    generate(false);
+  };
+
+  const copyShareLink = async () => {
+    try {
+      const url = `${window.location.origin}${window.location.pathname}?diagram=${diagramId}`;
+      await navigator.clipboard.writeText(url);
+      setLinkCopied(true);
+      setTimeout(() => setLinkCopied(false), 2000);
+    } catch (err) {
+      console.error('Failed to copy link: ', err);
+    }
+  };
+
   const copyToClipboard = async () => {
     try {
       await navigator.clipboard.writeText(mermaidScript);
@@ -55,6 +107,9 @@ function BPMNInterface() {
   const clearAll = () => {
     setDescription('');
     setMermaidScript('');
+    setDiagramId('');
+    setIsCached(false);
+    setIssues([]);
   };
 
   return (
@@ -100,11 +155,45 @@ function BPMNInterface() {
           </div>
         )}
 
+        {isLoading && streamedText && (
+          <pre style={{ margin: '0 1.5rem 1.5rem', padding: '0.75rem', background: '#f9fafb', borderRadius: '0.375rem', whiteSpace: 'pre-wrap', fontSize: '0.8rem', color: '#6b7280' }}>
+            {streamedText}
+          </pre>
+        )}
+
         {mermaidScript && !isLoading && (
           <div style={{ padding: '1.5rem' }}>
             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1rem' }}>
-              <h3 style={{ margin: 0, color: '#1e293b' }}>Generated Mermaid Script</h3>
+              <h3 style={{ margin: 0, color: '#1e293b' }}>
+                Generated Mermaid Script
+                {isCached && (
+                  <span style={{ marginLeft: '0.5rem', fontSize: '0.75rem', fontWeight: 'normal', color: '#64748b' }}>
+                    (previously generated)
+                  </span>
+                )}
+              </h3>
               <div className="bpmn-actions">
+                <button
+                  onClick={() => generate(true)}
+                  className="btn btn-secondary"
+                  style={{ fontSize: '0.875rem' }}
+                >
+                  <RefreshCw size={14} />
+                  Regenerate
+                </button>
+
+                {diagramId && (
+                  <button
+                    onClick={copyShareLink}
+                    className="btn btn-secondary"
+                    style={{ fontSize: '0.875rem' }}
+                  >
+                    {linkCopied ? <Check size={14} /> : <Link size={14} />}
+                    {linkCopied ? 'Link Copied!' : 'Share'}
+                  </button>
+                )}
+
+
                 <button
                   onClick={copyToClipboard}
                   className="btn btn-secondary"
@@ -138,6 +227,18 @@ function BPMNInterface() {
               {mermaidScript}
             </div>
 
+            {/* what the mermaid repair changed or found structurally wrong, worth a look before using the diagram */}
+            {issues.length > 0 && (
+              <details style={{ marginTop: '0.75rem', fontSize: '0.875rem', color: '#b45309' }}>
+                <summary style={{ cursor: 'pointer', fontWeight: '500' }}>
+                  {issues.length} diagram {issues.length === 1 ? 'issue' : 'issues'} found
+                </summary>
+                <ul style={{ marginLeft: '1.25rem', marginTop: '0.5rem' }}>
+                  {issues.map((issue, i) => <li key={i}>{issue}</li>)}
+                </ul>
+              </details>
+            )}
+
             <button 
               onClick={clearAll}
               className="btn btn-secondary"
@@ -1,13 +1,156 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import StatusModule from './StatusModule';
-import { Send, MessageCircle, Bot, User, Copy, Check } from 'lucide-react';
-import axios from 'axios';
+import { Send, MessageCircle, Bot, User, Copy, Check, FileText } from 'lucide-react';
+import { postEventStream } from '../streaming';
+
+// retrieval is prefetched once typing pauses this long on a question at least this long
+const prefetchDelayMs = 400;
+const prefetchMinLength = 12;
+
+const citationKey = (citation) => `${citation.edition || ''}:${citation.page}`;
+const editionQuery = (edition) => (edition ? `edition=${encodeURIComponent(edition)}` : '');
+
+// cited pages are fetched one at a time from /api/page (of the cited edition), never the whole pdf
+function PageCitations({ citations }) {
+  const [openPage, setOpenPage] = useState(null);
+  const [pageText, setPageText] = useState('');
+
+  const byKey = new Map();
+  citations
+    .filter(citation => Number.isInteger(citation.page))
+    .forEach(citation => byKey.set(citationKey(citation), citation));
+  const cited = [...byKey.values()].sort((a, b) => (
+    (a.edition || '').localeCompare(b.edition || '') || a.page - b.page
+  ));
+  if (cited.length === 0) return null;
+  const showEdition = new Set(cited.map(citation => citation.edition)).size > 1;
+
+  const showPage = async (citation) => {
+    if (openPage && citationKey(openPage) === citationKey(citation)) {
+      setOpenPage(null);
+      return;
+    }
+    setOpenPage(citation);
+    setPageText('Loading...');
+    try {
+      const query = editionQuery(citation.edition);
+      const response = await fetch(`/api/page/${citation.page}${query ? `?${query}` : ''}`);
+      const data = await response.json();
+      setPageText(response.ok ? data.text : data.error);
+    } catch (error) {
+      setPageText('Could not load this page.');
+    }
+  };
+
+  const openPdf = async (citation) => {
+    try {
+      const query = editionQuery(citation.edition);
+      const response = await fetch(`/api/page/${citation.page}?format=pdf${query ? `&${query}` : ''}`);
+      const blob = await response.blob();
+      window.open(URL.createObjectURL(blob), '_blank');
+    } catch (error) {
+      console.error('Failed to open page: ', error);
+    }
+  };
+
+  return (
+    <div style={{ marginTop: '0.5rem', fontSize: '0.875rem', color: '#6b7280' }}>
+      <span style={{ fontWeight: '500' }}>Cited pages: </span>
+      {cited.map(citation => (
+        <button
+          key={citationKey(citation)}
+          onClick={() => showPage(citation)}
+          className="btn btn-secondary"
+          style={{ fontSize: '0.75rem', padding: '0.125rem 0.5rem', marginRight: '0.25rem' }}
+        >
+          {showEdition ? `${citation.edition} p. ${citation.page}` : `Page ${citation.page}`}
+        </button>
+      ))}
+      {openPage !== null && (
+        <div style={{ marginTop: '0.5rem', padding: '0.75rem', background: '#f9fafb', borderRadius: '0.375rem', whiteSpace: 'pre-wrap' }}>
+          <button
+            onClick={() => openPdf(openPage)}
+            className="btn btn-secondary"
+            style={{ fontSize: '0.75rem', padding: '0.125rem 0.5rem', marginBottom: '0.5rem' }}
+          >
+            <FileText size={12} />
+            Open page {openPage.page} as PDF
+          </button>
+          <div>{pageText}</div>
+        </div>
+      )}
+    </div>
+  );
+}
 
 function QAInterface() {
   const [messages, setMessages] = useState([]);
   const [question, setQuestion] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [copiedIndex, setCopiedIndex] = useState(null);
+  const [chapters, setChapters] = useState([]);
+  const [chapter, setChapter] = useState('');
+  const [editions, setEditions] = useState([]);
+  const [selectedEditions, setSelectedEditions] = useState([]);
+  const [preview, setPreview] = useState(null);
+
+  // chapters detected at ingestion, an empty list just hides the selector
+  useEffect(() => {
+    fetch('/api/sections')
+      .then(response => (response.ok ? response.json() : { sections: [] }))
+      .then(data => setChapters(data.sections.filter(section => !section.id.includes('.'))))
+      .catch(() => setChapters([]));
+    // with a single edition there is nothing to choose
+    fetch('/api/editions')
+      .then(response => (response.ok ? response.json() : { editions: [] }))
+      .then(data => {
+        setEditions(data.editions);
+        setSelectedEditions(data.editions.filter(edition => edition.default).map(edition => edition.name));
+      })
+      .catch(() => setEditions([]));
+  }, []);
+
+  // the same body for the prefetch and the real question, so both hit the same server cache entry
+  const requestBody = (text) => {
+    const body = { question: text };
+    if (chapter) body.chapter = chapter;
+    if (editions.length > 1 && selectedEditions.length > 0) body.editions = selectedEditions;
+    return body;
+  };
+
+  // retrieval-only prefetch while the question is typed: the answer request then finds
+  // its embedding and sources already cached; a newer keystroke cancels the older prefetch
+  useEffect(() => {
+    const text = question.trim();
+    if (text.length < prefetchMinLength || isLoading) {
+      setPreview(null);
+      return undefined;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch('/api/retrieve', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(requestBody(question)),
+        signal: controller.signal
+      })
+        .then(response => (response.ok ? response.json() : null))
+        .then(data => setPreview(data))
+        .catch(() => {});
+    }, prefetchDelayMs);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [question, chapter, selectedEditions, isLoading]);
+
+  const toggleEdition = (name) => {
+    setSelectedEditions(prev => (
+      prev.includes(name) ? prev.filter(selected => selected !== name) : [...prev, name]
+    ));
+  };
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -18,14 +161,31 @@ function QAInterface() {
     setIsLoading(true);
 
     try {
-      const response = await axios.post('/api/qa', { question });
-      const answerMessage = { 
-        type: 'answer', 
-        content: response.data.answer, 
-        context: response.data.context,
-        timestamp: new Date() 
+      // sources arrive first, then the answer streams in token by token
+      const answerId = Date.now();
+      const updateAnswer = (update) => {
+        setMessages(prev => prev.map(message => (
+          message.id === answerId ? { ...message, ...update(message) } : message
+        )));
       };
-      setMessages(prev => [...prev, answerMessage]);
+      await postEventStream('/api/qa/stream', requestBody(question), (event, data) => {
+        if (event === 'sources') {
+          setIsStreaming(true);
+          setMessages(prev => [...prev, {
+            id: answerId,
+            type: 'answer',
+            content: '',
+            context: data.context,
+            citations: data.citations || (data.pages || []).map(page => ({ page })),
+            sections: data.sections || [],
+            timestamp: new Date()
+          }]);
+        } else if (event === 'token') {
+          updateAnswer(message => ({ content: message.content + data.text }));
+        } else if (event === 'error') {
+          throw new Error(data.error);
+        }
+      });
     } catch (error) {
       console.error('Error:', error);
       const errorMessage = { 
@@ -36,6 +196,7 @@ function QAInterface() {
       setMessages(prev => [...prev, errorMessage]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
       setQuestion('');
     }
   };
@@ -148,11 +309,20 @@ function QAInterface() {
                     </div>
                   </details>
                 )}
+                {message.type === 'answer' && message.sections && message.sections.length > 0 && (
+                  <div style={{ marginTop: '0.5rem', fontSize: '0.875rem', color: '#6b7280' }}>
+                    <span style={{ fontWeight: '500' }}>Cited sections: </span>
+                    {message.sections.join('; ')}
+                  </div>
+                )}
+                {message.type === 'answer' && message.citations && (
+                  <PageCitations citations={message.citations} />
+                )}
               </div>
             ))
           )}
           
-          {isLoading && (
+          {isLoading && !isStreaming && (
             <div className="loading-message">
               <div className="spinner"></div>
               <span>Processing your question...</span>
@@ -177,7 +347,50 @@ function QAInterface() {
                 }
               }}
             />
+            {preview && preview.chunks.length > 0 && (
+              <div style={{ marginTop: '0.25rem', fontSize: '0.75rem', color: '#6b7280' }}>
+                Likely sources: {[...new Set(preview.chunks.map(chunk => chunk.section || `Page ${chunk.page}`))].join('; ')}
+              </div>
+            )}
           </div>
+
+          {editions.length > 1 && (
+            <div className="input-group">
+              <label>Editions</label>
+              <div style={{ display: 'flex', gap: '1rem', flexWrap: 'wrap' }}>
+                {editions.map(edition => (
+                  <label key={edition.name} style={{ fontWeight: 'normal', display: 'flex', alignItems: 'center', gap: '0.25rem' }}>
+                    <input
+                      type="checkbox"
+                      checked={selectedEditions.includes(edition.name)}
+                      onChange={() => toggleEdition(edition.name)}
+                      disabled={isLoading}
+                    />
+                    {edition.label}
+                  </label>
+                ))}
+              </div>
+            </div>
+          )}
+
+          {chapters.length > 0 && (
+            <div className="input-group">
+              <label htmlFor="chapter">Search in</label>
+              <select
+                id="chapter"
+                value={chapter}
+                onChange={(e) => setChapter(e.target.value)}
+                disabled={isLoading}
+              >
+                <option value="">Whole document</option>
+                {chapters.map(section => (
+                  <option key={section.id} value={section.id}>
+                    Chapter {section.id} {section.title}
+                  </option>
+                ))}
+              </select>
+            </div>
+          )}
           
           <button 
             type="submit" 
@@ -25,20 +25,18 @@ function StatusModule() {
       setStatuses(prev => ({ ...prev, api: 'offline' }));
     }
 
-    // Check Ollama
+    // Ollama and the vector DB are checked in the background by the server,
+    // this only reads the last results
     try {
-      await axios.get('/api/health/ollama');
-      setStatuses(prev => ({ ...prev, ollama: 'online' }));
+      const response = await axios.get('/api/health/status');
+      const toStatus = (check) => (check.status === 'healthy' ? 'online' : check.status === 'checking' ? 'checking' : 'offline');
+      setStatuses(prev => ({
+        ...prev,
+        ollama: toStatus(response.data.ollama),
+        vectorDb: toStatus(response.data.vectordb)
+      }));
     } catch (error) {
-      setStatuses(prev => ({ ...prev, ollama: 'offline' }));
-    }
-
-    // Check Vector DB
-    try {
-      await axios.get('/api/health/vectordb');
-      setStatuses(prev => ({ ...prev, vectorDb: 'online' }));
-    } catch (error) {
-      setStatuses(prev => ({ ...prev, vectorDb: 'offline' }));
+      setStatuses(prev => ({ ...prev, ollama: 'offline', vectorDb: 'offline' }));
     }
   };
 
@@ -0,0 +1,127 @@
+# background health checks whose results the health endpoints serve from memory
+import json
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+def ollama_base_url():
+    """the ollama server the langchain clients talk to (OLLAMA_HOST, as ollama itself reads it)"""
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+def model_available(name, available):
+    """ollama lists "llama3.2:latest" for a model pulled as "llama3.2" """
+    return name in available or (":" not in name and f"{name}:latest" in available)
+
+def ollama_probe(required_models, timeout=2.0):
+    """
+    Builds a probe that lists the pulled models (GET /api/tags). It never loads
+    a model or generates anything, so it costs ollama next to nothing.
+    """
+    def probe():
+        with urllib.request.urlopen(f"{ollama_base_url()}/api/tags", timeout=timeout) as response:
+            tags = json.load(response)
+        available = {entry.get("name") for entry in tags.get("models", [])}
+        missing = [name for name in required_models if not model_available(name, available)]
+        details = {"models": sorted(name for name in available if name)}
+        if missing:
+            return "error", f"ollama is running but model(s) not pulled: {', '.join(missing)}", details
+        return "healthy", "ollama is running and the models are available", details
+    return probe
+
+def vectordb_probe(get_vector_store, editions=None):
+    """
+    builds a probe that counts the chunks in the chroma collection of every edition
+    (the default collection when no edition names are given); any empty or unreadable
+    collection makes the database unhealthy, since fan-out queries over it would fail
+    """
+    def probe():
+        counts, failures = {}, []
+        for edition in editions or [None]:
+            try:
+                counts[edition] = get_vector_store(edition)._collection.count()
+            except Exception as e:
+                counts[edition] = None
+                failures.append(f"{edition or 'default'} collection is not readable ({e})")
+                continue
+            if counts[edition] == 0:
+                failures.append(f"{edition or 'default'} collection is empty, run railway_vector.py"
+                                + (f" --edition {edition}" if edition else "") + " to ingest the pdf")
+        total = sum(count for count in counts.values() if count)
+        details = {"documents": total}
+        if editions:
+            details["editions"] = counts
+        if failures:
+            return "error", "; ".join(failures), details
+        return "healthy", f"vector database is accessible with {total} documents", details
+    return probe
+
+class HealthMonitor:
+    """
+    Runs every probe on a daemon thread every `interval` seconds and keeps the last
+    result of each, with when it was checked and how long the probe took. Reading a
+    status never touches ollama or chroma.
+
+    A probe returns (status, message, details) or raises, which counts as "error".
+    Before the first check finishes the status is "checking".
+    """
+
+    def __init__(self, probes, interval=30.0):
+        self.probes = probes
+        self.interval = interval
+        self._results = {name: {"status": "checking", "message": "first check pending"} for name in probes}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_now()
+            self._stop.wait(self.interval)
+
+    def check_now(self):
+        """runs every probe once (on the calling thread) and stores the results"""
+        for name, probe in self.probes.items():
+            started = time.perf_counter()
+            try:
+                status, message, details = probe()
+            except Exception as e:
+                status, message, details = "error", str(e) or type(e).__name__, {}
+            latency_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                previous = self._results.get(name, {})
+                failures = previous.get("consecutive_failures", 0) + 1 if status != "healthy" else 0
+                self._results[name] = {
+                    "status": status,
+                    "message": message,
+                    "details": details,
+                    "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "checked_monotonic": time.monotonic(),
+                    "latency_ms": round(latency_ms, 1),
+                    "consecutive_failures": failures,
+                }
+
+    def status(self, name):
+        """the cached result of one probe, with its age in seconds"""
+        with self._lock:
+            result = dict(self._results[name])
+        checked = result.pop("checked_monotonic", None)
+        result["age_seconds"] = round(time.monotonic() - checked, 1) if checked is not None else None
+        result["interval_seconds"] = self.interval
+        return result
+
+    def statuses(self):
+        return {name: self.status(name) for name in self.probes}
@@ -0,0 +1,114 @@
+# keyword (bm25) inverted index over the stored chunks, used next to vector search
+import json
+import math
+import os
+import re
+from collections import Counter
+
+# words, acronyms, codes and dotted section numbers like 4.2.1 or ATB-NG stay single tokens
+token_pattern = re.compile(r"[A-Za-z0-9]+(?:[.\-/][A-Za-z0-9]+)*")
+stopwords = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "if", "in", "is", "it", "of", "on", "or", "that", "the", "there", "this", "to", "what",
+    "when", "where", "which", "who", "why", "with", "about", "must", "should", "we", "you",
+}
+# words that only point at document structure, they don't make a query any less "exact"
+structural_words = {"section", "chapter", "paragraph", "annex", "appendix", "article", "page", "code", "station"}
+
+def tokenize(text):
+    return [token.lower() for token in token_pattern.findall(text) if token.lower() not in stopwords]
+
+def is_exact_term(token):
+    """section numbers, codes and acronyms: anything with a digit or written in capitals"""
+    return any(ch.isdigit() for ch in token) or (len(token) >= 2 and token.isupper())
+
+def is_exact_term_query(query):
+    """
+    True for short lookups such as "TTR", "ATB" or "section 4.2.1" that keyword
+    search answers on its own, without embedding the query.
+    """
+    terms = [token for token in token_pattern.findall(query)
+             if token.lower() not in stopwords and token.lower() not in structural_words]
+    return 0 < len(terms) <= 4 and all(is_exact_term(term) for term in terms)
+
+def reciprocal_rank_scores(rankings, k=60):
+    """(id, fused score) pairs best first, an id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class KeywordIndex:
+    """
+    BM25 over an inverted index of chunk texts. Only ids are stored, the chunk
+    text and metadata stay in chroma and are fetched by id.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = {}  # term -> {doc index: term frequency}
+        self.average_length = 0.0
+
+    @classmethod
+    def build(cls, ids, texts, **kwargs):
+        index = cls(**kwargs)
+        for doc_index, (doc_id, text) in enumerate(zip(ids, texts)):
+            tokens = tokenize(text)
+            index.doc_ids.append(doc_id)
+            index.doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                index.postings.setdefault(term, {})[doc_index] = frequency
+        if index.doc_lengths:
+            index.average_length = sum(index.doc_lengths) / len(index.doc_lengths)
+        return index
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query, k=5, allowed=None):
+        """returns up to k (chunk id, bm25 score) pairs, best first; `allowed` limits the candidate chunk ids"""
+        n_docs = len(self.doc_ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, frequency in postings.items():
+                if allowed is not None and self.doc_ids[doc_index] not in allowed:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.average_length or 1)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[doc_index], score) for doc_index, score in best]
+
+    def save(self, path):
+        """json on disk, written atomically next to the vector db"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.doc_ids = data["doc_ids"]
+        index.doc_lengths = data["doc_lengths"]
+        # json turns the integer doc indexes into strings
+        index.postings = {term: {int(doc_index): frequency for doc_index, frequency in postings.items()}
+                          for term, postings in data["postings"].items()}
+        if index.doc_lengths:
+            index.average_length = sum(index.doc_lengths) / len(index.doc_lengths)
+        return index
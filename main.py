@@ -1,36 +1,43 @@
 # import ollama llm & prompt template
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
+import argparse
 import json
+import sys
+import time
 # import retriever from vector.py file
-from railway_vector import retriever
+from railway_vector import get_retriever, embedding_model, editions as registered_editions
 from bpmn_generator import generate_bpmn_from_description as bpmn_generator
+from context_builder import assemble_context, estimate_tokens
+from batch_qa import parse_questions_jsonl, answer_batch
+from editions import parse_editions
+from warmup import ModelWarmer, keep_alive, warmup_enabled, warmup_timeout
 
 
-# using llama 3.2
-model = OllamaLLM(model="llama3.2")
+# using llama 3.2, kept loaded for RAG_KEEP_ALIVE after each request
+model = OllamaLLM(model="llama3.2", keep_alive=keep_alive)
 
-def run_qa_session():
-    """Handles the Question & Answer session."""
-    # q&a prompt and chain
-    qa_template = """
-    You are an expert Q&A system for railway transport regulations in the Netherlands.
-    Your task is to answer the user's question by following these steps:
-    1.  First, identify the single most direct and primary answer to the question from the provided context. State this answer clearly and concisely.
-    2.  After providing the direct answer, look through ALL the context provided. If there are any important exceptions, conditions, or related details (like different rules for specific routes or situations), add a section called "Additional Context" and briefly list them.
-    3.  Base your entire response ONLY on the provided context. Do not add information or reasoning that is not present.
-    4.  If the context does not contain a direct answer, state that you cannot find the information in the provided document.
-    5.  Cite the source page number(s) for your information.
+# q&a prompt and chain
+qa_template = """
+You are an expert Q&A system for railway transport regulations in the Netherlands.
+Your task is to answer the user's question by following these steps:
+1.  First, identify the single most direct and primary answer to the question from the provided context. State this answer clearly and concisely.
+2.  After providing the direct answer, look through ALL the context provided. If there are any important exceptions, conditions, or related details (like different rules for specific routes or situations), add a section called "Additional Context" and briefly list them.
+3.  Base your entire response ONLY on the provided context. Do not add information or reasoning that is not present.
+4.  If the context does not contain a direct answer, state that you cannot find the information in the provided document.
+5.  Cite the source section and page number(s) for your information, and the edition when the sources name one.
 
-    Here is the context:
-    {context}
+Here is the context:
+{context}
 
-    Here is the question:
-    {question}
-    """
-    qa_prompt = ChatPromptTemplate.from_template(qa_template)
-    qa_chain = qa_prompt | model
+Here is the question:
+{question}
+"""
+qa_prompt = ChatPromptTemplate.from_template(qa_template)
+qa_chain = qa_prompt | model
 
+def run_qa_session(editions=None):
+    """Handles the Question & Answer session, searching the given editions (the default ones for None)."""
     while True:
         print("\nQ&A Mode:")
         question = input("Ask a question about the Network Statement (or type 'back' to return to menu): ")
@@ -38,12 +45,15 @@ def run_qa_session():
             break
 
         # retrieve relevant documents from vector database
-        retrieved_docs = retriever.invoke(question)
-        # format context with page numbers for citation
-        context = "\n\n".join([f"Source (Page {doc.metadata.get('page', 'N/A')}):\n{doc.page_content}" for doc in retrieved_docs])
+        retrieved_docs = get_retriever().invoke(question, editions=editions)
+        # format context with page numbers for citation, merging overlapping chunks within the token budget
+        assembled = assemble_context(retrieved_docs)
+        context = assembled["context"]
         # alternatively, the page uuid could be kept (not context page number) and be used as evidence to what is retrieved  
         
         # generate answer using llm with retrieved context
+        prompt_tokens = estimate_tokens(qa_prompt.format(context=context, question=question))
+        print(f"(prompt ~{prompt_tokens} tokens from {assembled['chunks_used']} of {assembled['chunks_retrieved']} chunks)")
         result = qa_chain.invoke({"context": context, "question": question})
         print("\nAnswer:")
         print(result)
@@ -72,8 +82,64 @@ def run_bpmn_session():
             f.write(f"```mermaid\n{mermaid_script}\n```")
         print(f"Script saved as {filename}")
 
+def warm_models():
+    """loads both models and prints the cold vs warm latency of each"""
+    warmer = ModelWarmer([model.model], [embedding_model], timeout=warmup_timeout)
+    print("Warming up models...", file=sys.stderr)
+    warmer.warm_now("startup")
+    for line in warmer.report():
+        print(f"  {line}", file=sys.stderr)
+    return warmer
+
+def run_batch(input_path, output_path=None, concurrency=4, editions=None):
+    """
+    Answers every question in a jsonl file, writing one jsonl result per line as each finishes.
+    Questions without their own "editions" search `editions` (the default ones for None).
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        items = parse_questions_jsonl(f)
+    print(f"Answering {len(items)} questions with {concurrency} concurrent generations...", file=sys.stderr)
+
+    out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    started = time.perf_counter()
+    try:
+        for done, result in enumerate(answer_batch(items, qa_prompt, qa_chain.invoke, concurrency=concurrency, editions=editions), 1):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            print(f"[{done}/{len(items)}] {result['id']} in {result['timings']['total_ms']:.0f} ms", file=sys.stderr)
+    finally:
+        if output_path:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"Done: {len(items)} questions in {elapsed:.1f}s ({len(items) / elapsed:.2f} questions/sec)", file=sys.stderr)
+
 # --- main application loop ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ab Ovo Railway RAG System")
+    parser.add_argument("--batch", metavar="QUESTIONS_JSONL", help="answer every question in a jsonl file non-interactively")
+    parser.add_argument("--output", metavar="ANSWERS_JSONL", help="where to write batch results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent llm generations in batch mode")
+    parser.add_argument("--editions", help=f"comma separated editions to search in q&a and batch mode ({', '.join(registered_editions)})")
+    parser.add_argument("--warmup", action="store_true", help="load both models, report cold vs warm latency and exit")
+    args = parser.parse_args()
+    try:
+        editions = parse_editions(args.editions, registered_editions)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.warmup:
+        warm_models()
+        sys.exit(0)
+    if args.batch:
+        # warm first, so the first questions' timings are not inflated by model loading
+        if warmup_enabled:
+            warm_models()
+        run_batch(args.batch, args.output, args.concurrency, editions)
+        sys.exit(0)
+
+    # the models load in the background while the menu is shown
+    if warmup_enabled:
+        ModelWarmer([model.model], [embedding_model], timeout=warmup_timeout).start()
+
     while True:
         print("\n\n===== Ab Ovo Railway RAG System =====")
         print("1. Ask a question about the Network Statement (Q&A)")
@@ -82,7 +148,7 @@ if __name__ == "__main__":
         choice = input("Choose an option: ")
 
         if choice == "1":
-            run_qa_session()
+            run_qa_session(editions)
         elif choice == "2":
             run_bpmn_session()
         elif choice.lower() == "q":
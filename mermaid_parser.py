@@ -0,0 +1,365 @@
+# single-pass tokenizer/parser for llm-generated mermaid flowcharts
+# builds a small graph ast, repairs the usual llm mistakes structurally and emits canonical mermaid
+import re
+
+# node shapes, longest openers first so "[[" wins over "["
+shape_kinds = [
+    ("[[", "]]", "subroutine"),
+    ("([", "])", "stadium"),
+    ("[(", ")]", "cylinder"),
+    ("((", "))", "circle"),
+    ("{{", "}}", "hexagon"),
+    ("[", "]", "rect"),
+    ("(", ")", "round"),
+    ("{", "}", "rhombus"),
+]
+gateway_shapes = {"rhombus", "hexagon"}
+shape_delimiters = {kind: (opener, closer) for opener, closer, kind in shape_kinds}
+
+_shape_pattern = "|".join(
+    re.escape(opener) + r'(?:"[^"\n]*"|[^\n]*?)' + re.escape(closer) for opener, closer, _ in shape_kinds)
+
+token_regex = re.compile(rf"""
+    (?P<ws>\s+)
+  | (?P<pipe_arrow>--\|(?P<pipe_arrow_label>[^|\n]*)\|\s*(?:-*>+|\|>)?)
+  | (?P<text_arrow>--(?![->|])\s*(?P<text_arrow_label>[^\n]*?)\s*-->)
+  | (?P<bad_shape>(?<=[A-Za-z0-9_])>[^\]\n|>]*\])
+  | (?P<arrow><?(?:-\.+-?>|={{2,}}>|-{{2,}}>|-{{3,}}|->|\|>|>))
+  | (?P<label>\|(?P<label_text>[^|\n]*)\|)
+  | (?P<shape>{_shape_pattern})
+  | (?P<string>"[^"\n]*")
+  | (?P<id>[A-Za-z0-9_]+(?:[.\-][A-Za-z0-9_]+)*)
+  | (?P<amp>&)
+  | (?P<semi>;)
+  | (?P<other>.)
+""", re.VERBOSE)
+
+header_regex = re.compile(r"^\s*(?:graph|flowchart)\b\s*(TB|TD|BT|RL|LR)?\s*;?", re.IGNORECASE)
+fence_regex = re.compile(r"^\s*```")
+comment_regex = re.compile(r"^\s*%%")
+passthrough_regex = re.compile(r"^\s*(?:classDef|class|style|linkStyle)\s+\S")
+# subgraph blocks are flattened, their contents are kept
+block_regex = re.compile(r"^\s*(?:subgraph\b.*|end|direction\s+\w+)\s*;?\s*$")
+edge_label_junk = re.compile(r'-+>|<-+|["|\[\]{}()<>:;]')
+node_label_junk = re.compile(r'\\?"')
+whitespace = re.compile(r"\s+")
+invalid_id_chars = re.compile(r"\W")
+# ids mermaid would read as keywords
+reserved_ids = {"end", "graph", "subgraph", "flowchart", "style", "class", "classdef", "click", "linkstyle", "direction"}
+
+class Node:
+    __slots__ = ("id", "label", "shape")
+
+    def __init__(self, node_id, label=None, shape=None):
+        self.id = node_id
+        self.label = label
+        self.shape = shape
+
+    @property
+    def is_gateway(self):
+        return self.shape in gateway_shapes
+
+class Edge:
+    __slots__ = ("source", "target", "label")
+
+    def __init__(self, source, target, label=None):
+        self.source = source
+        self.target = target
+        self.label = label
+
+class MermaidGraph:
+    """
+    Parsed flowchart: nodes by id (in first-seen order), directed edges, passthrough
+    style statements and a list of issues found while parsing and validating.
+    """
+
+    def __init__(self, direction="TD"):
+        self.direction = direction
+        self.nodes = {}
+        self.edges = []
+        self.extra = []
+        self.issues = []
+        self._auto_ids = {}
+        self._edge_keys = set()
+
+    # --- building ---
+
+    def node(self, node_id, label=None, shape=None):
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = Node(node_id)
+        # the first real definition wins, later bare references don't erase it
+        if label and node.label is None:
+            node.label = label
+            node.shape = shape or "rect"
+        return node
+
+    def auto_id(self, label):
+        """stable generated id for a node the llm only gave as a quoted label"""
+        node_id = self._auto_ids.get(label)
+        if node_id is None:
+            counter = len(self._auto_ids) + 1
+            node_id = f"auto{counter}"
+            while node_id in self.nodes:
+                counter += 1
+                node_id = f"auto{counter}"
+            self._auto_ids[label] = node_id
+        return node_id
+
+    def add_edge(self, source, target, label=None):
+        key = (source, target, label)
+        if key not in self._edge_keys:
+            self._edge_keys.add(key)
+            self.edges.append(Edge(source, target, label))
+
+    # --- queries ---
+
+    def connected_ids(self):
+        ids = set()
+        for edge in self.edges:
+            ids.add(edge.source)
+            ids.add(edge.target)
+        return ids
+
+    def gateways(self):
+        return [node for node in self.nodes.values() if node.is_gateway]
+
+    def components(self):
+        """weakly connected components over the edges, as lists of node ids"""
+        parent = {node_id: node_id for node_id in self.connected_ids()}
+
+        def find(node_id):
+            while parent[node_id] != node_id:
+                parent[node_id] = parent[parent[node_id]]
+                node_id = parent[node_id]
+            return node_id
+
+        for edge in self.edges:
+            parent[find(edge.source)] = find(edge.target)
+        groups = {}
+        for node_id in parent:
+            groups.setdefault(find(node_id), []).append(node_id)
+        return list(groups.values())
+
+    # --- output ---
+
+    def to_mermaid(self):
+        """canonical mermaid: header, node definitions, edges, then style statements"""
+        lines = [f"graph {self.direction}"]
+        connected = self.connected_ids()
+        for node in self.nodes.values():
+            if node.label is None or (self.edges and node.id not in connected):
+                continue
+            opener, closer = shape_delimiters[node.shape]
+            lines.append(f'    {node.id}{opener}"{node.label}"{closer}')
+        for edge in self.edges:
+            arrow = f"-->|{edge.label}|" if edge.label else "-->"
+            lines.append(f"    {edge.source} {arrow} {edge.target}")
+        lines.extend(f"    {statement}" for statement in self.extra)
+        return "\n".join(lines)
+
+def clean_node_label(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        text = text[1:-1]
+    text = whitespace.sub(" ", node_label_junk.sub("'", text)).strip()
+    return text or None
+
+def clean_edge_label(text):
+    text = whitespace.sub(" ", edge_label_junk.sub(" ", text)).strip()
+    return text or None
+
+def clean_id(raw_id):
+    node_id = invalid_id_chars.sub("_", raw_id)
+    if node_id.lower() in reserved_ids:
+        node_id += "_node"
+    return node_id
+
+def tokenize(text):
+    """(kind, match) pairs for one line, whitespace dropped"""
+    tokens = []
+    for match in token_regex.finditer(text):
+        kind = match.lastgroup
+        if kind != "ws":
+            tokens.append((kind, match))
+    return tokens
+
+def split_statements(tokens):
+    statement = []
+    for token in tokens:
+        if token[0] == "semi":
+            if statement:
+                yield statement
+            statement = []
+        else:
+            statement.append(token)
+    if statement:
+        yield statement
+
+def shape_of(text):
+    for opener, closer, kind in shape_kinds:
+        if text.startswith(opener) and text.endswith(closer) and len(text) >= len(opener) + len(closer):
+            return kind, text[len(opener):len(text) - len(closer)]
+    return None, text
+
+def parse_node(tokens, pos):
+    """
+    node := id shape? | "quoted label" | shape
+    A malformed shape right after an id ("B>flag]") is dropped, not read as an edge.
+    Returns ((id or None, label, shape), next position) or (None, pos).
+    An id of None means the node still needs a generated id.
+    """
+    if pos >= len(tokens):
+        return None, pos
+    kind, match = tokens[pos]
+    if kind == "id":
+        node_id = clean_id(match.group())
+        if pos + 1 < len(tokens) and tokens[pos + 1][0] == "bad_shape":
+            return (node_id, None, None), pos + 2
+        if pos + 1 < len(tokens) and tokens[pos + 1][0] == "shape":
+            shape, content = shape_of(tokens[pos + 1][1].group())
+            return (node_id, clean_node_label(content), shape), pos + 2
+        return (node_id, None, None), pos + 1
+    if kind == "string":
+        # repair: a quoted string used as a node id becomes a labelled node with a generated id
+        return (None, clean_node_label(match.group()), "rect"), pos + 1
+    if kind == "shape":
+        # repair: a shape without an id
+        shape, content = shape_of(match.group())
+        return (None, clean_node_label(content), shape), pos + 1
+    return None, pos
+
+def parse_group(tokens, pos):
+    """group := node ("&" node)*"""
+    node, pos = parse_node(tokens, pos)
+    if node is None:
+        return None, pos
+    group = [node]
+    while pos + 1 < len(tokens) and tokens[pos][0] == "amp":
+        node, next_pos = parse_node(tokens, pos + 1)
+        if node is None:
+            break
+        group.append(node)
+        pos = next_pos
+    return group, pos
+
+def parse_edge(tokens, pos):
+    """
+    edge := arrow label? | --|label|--> | -- label -->
+    Every arrow style is accepted and normalized to "-->". Returns (label, next position)
+    or (None, None) when there is no edge at pos.
+    """
+    if pos >= len(tokens):
+        return None, None
+    kind, match = tokens[pos]
+    if kind == "pipe_arrow":
+        label, pos = match.group("pipe_arrow_label"), pos + 1
+    elif kind == "text_arrow":
+        label, pos = match.group("text_arrow_label"), pos + 1
+    elif kind == "arrow":
+        label, pos = None, pos + 1
+        if pos < len(tokens) and tokens[pos][0] == "label":
+            label, pos = tokens[pos][1].group("label_text"), pos + 1
+    else:
+        return None, None
+    # repair: stray arrow heads after a label, e.g. "-->|Yes|> B"
+    while pos < len(tokens) and tokens[pos][0] == "arrow":
+        pos += 1
+    return (clean_edge_label(label) if label else None), pos
+
+def parse_statement(tokens, graph, line_number, raw_line):
+    """statement := group (edge group)*, applied to the graph only if it parses"""
+    for position, (kind, match) in enumerate(tokens):
+        if kind == "bad_shape" and position > 0:
+            graph.issues.append(f"line {line_number}: ignored malformed node shape "
+                                f"{tokens[position - 1][1].group() + match.group()!r}")
+    group, pos = parse_group(tokens, 0)
+    if group is None:
+        graph.issues.append(f"line {line_number}: skipped unparseable statement: {raw_line.strip()}")
+        return
+    chain, labels = [group], []
+    while pos < len(tokens):
+        label, next_pos = parse_edge(tokens, pos)
+        if next_pos is None:
+            break
+        next_group, next_pos = parse_group(tokens, next_pos)
+        if next_group is None:
+            break
+        labels.append(label)
+        chain.append(next_group)
+        pos = next_pos
+
+    if pos < len(tokens):
+        if len(chain) == 1:
+            # not a node definition and no edge: prose, braces used as code blocks, etc.
+            graph.issues.append(f"line {line_number}: skipped unparseable statement: {raw_line.strip()}")
+            return
+        graph.issues.append(f"line {line_number}: ignored trailing text: {raw_line.strip()}")
+
+    resolved = []
+    for group in chain:
+        ids = []
+        for node_id, label, shape in group:
+            if node_id is None:
+                if label is None:
+                    continue
+                node_id = graph.auto_id(label)
+            graph.node(node_id, label, shape)
+            ids.append(node_id)
+        resolved.append(ids)
+    for sources, label, targets in zip(resolved, labels, resolved[1:]):
+        for source in sources:
+            for target in targets:
+                graph.add_edge(source, target, label)
+
+def parse_mermaid(code):
+    """parses (possibly broken) mermaid flowchart code into a MermaidGraph in one pass"""
+    graph = MermaidGraph()
+    seen_header = False
+    for line_number, line in enumerate(code.splitlines(), 1):
+        if not line.strip() or fence_regex.match(line) or comment_regex.match(line) or block_regex.match(line):
+            continue
+        header = header_regex.match(line)
+        if header:
+            if not seen_header and header.group(1):
+                graph.direction = header.group(1).upper()
+            seen_header = True
+            line = line[header.end():]
+            if not line.strip():
+                continue
+        if passthrough_regex.match(line):
+            graph.extra.append(line.strip().rstrip(";"))
+            continue
+        for statement in split_statements(tokenize(line)):
+            parse_statement(statement, graph, line_number, line)
+    return graph
+
+def validate(graph):
+    """structural checks on a parsed graph, returned as human readable issues"""
+    issues = []
+    if not graph.edges:
+        issues.append("diagram has no edges")
+        return issues
+    connected = graph.connected_ids()
+    unconnected = [node.id for node in graph.nodes.values() if node.id not in connected]
+    if unconnected:
+        issues.append(f"dropped unconnected nodes: {', '.join(unconnected)}")
+    components = graph.components()
+    if len(components) > 1:
+        issues.append(f"diagram has {len(components)} disconnected parts")
+    targets = {edge.target for edge in graph.edges}
+    if not any(node_id not in targets for node_id in connected):
+        issues.append("diagram has no start node (every node has an incoming edge)")
+    outgoing = {}
+    for edge in graph.edges:
+        outgoing[edge.source] = outgoing.get(edge.source, 0) + 1
+    for gateway in graph.gateways():
+        if gateway.id in connected and outgoing.get(gateway.id, 0) < 2:
+            issues.append(f"gateway {gateway.id} has {outgoing.get(gateway.id, 0)} outgoing edge(s)")
+    return issues
+
+def repair_mermaid(code):
+    """parse, repair and validate; the returned graph carries every issue found"""
+    graph = parse_mermaid(code)
+    graph.issues.extend(validate(graph))
+    return graph
@@ -0,0 +1,124 @@
+# minimal thread-safe prometheus metrics, cheap enough to stay on in production
+import bisect
+import threading
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+                                for labels, value in sorted(values.items())]
+
+class Gauge(Metric):
+    """a gauge whose value is read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def render(self):
+        return self.header() + [f"{self.name} {format_value(self.callback())}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = self.header()
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, [('le', format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(float(series[-2]))}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+requests_total = registry.register(Counter(
+    "rag_requests_total", "API requests by endpoint and status code", ("endpoint", "status")))
+request_seconds = registry.register(Histogram(
+    "rag_request_seconds", "API request latency (until the response starts for streams)", latency_buckets, ("endpoint",)))
+stage_seconds = registry.register(Histogram(
+    "rag_stage_seconds", "Latency of pipeline stages: embed, retrieve, context_format, llm_first_token, llm_total, mermaid_postprocess",
+    latency_buckets, ("stage",)))
+retrieved_chunks = registry.register(Histogram(
+    "rag_retrieved_chunks", "Chunks returned by retrieval per request", (0, 1, 2, 3, 5, 8, 10, 15, 20, 50)))
+prompt_tokens = registry.register(Histogram(
+    "rag_prompt_tokens", "Estimated prompt size in tokens", (250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000), ("kind",)))
+generation_tokens_per_second = registry.register(Histogram(
+    "rag_generation_tokens_per_second", "LLM output speed (streamed chunks per second)", (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200), ("kind",)))
+cache_lookups = registry.register(Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")))
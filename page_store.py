@@ -0,0 +1,97 @@
+# per-page text and single-page pdfs extracted at ingestion, so a citation never needs the whole pdf
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from pypdf import PdfReader, PdfWriter
+
+index_name = "index.json"
+
+def page_text_path(store_dir, page):
+    return os.path.join(store_dir, f"{page}.txt")
+
+def page_pdf_path(store_dir, page):
+    return os.path.join(store_dir, f"{page}.pdf")
+
+def read_index(store_dir):
+    try:
+        with open(os.path.join(store_dir, index_name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def build_page_store(pdf_path, store_dir, pdf_hash):
+    """
+    Writes the text and a single-page pdf for every page of `pdf_path`. Pages are numbered
+    from 0 like the chunk metadata, so a citation's page number is the file name. The index
+    is written last and records the pdf hash, a half-built store is rebuilt on the next run.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    reader = PdfReader(pdf_path)
+    for page_number, page in enumerate(reader.pages):
+        with open(page_text_path(store_dir, page_number), "w", encoding="utf-8") as f:
+            f.write(page.extract_text() or "")
+        writer = PdfWriter()
+        writer.add_page(page)
+        with open(page_pdf_path(store_dir, page_number), "wb") as f:
+            writer.write(f)
+    index = {"source": pdf_path, "sha256": pdf_hash, "pages": len(reader.pages)}
+    tmp_path = os.path.join(store_dir, index_name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(store_dir, index_name))
+    return index["pages"]
+
+def page_store_current(store_dir, pdf_hash):
+    index = read_index(store_dir)
+    return index is not None and index.get("sha256") == pdf_hash
+
+class PageStore:
+    """read side of a built page store, recently read page texts are kept in memory"""
+
+    def __init__(self, store_dir, max_cached_pages=64):
+        self.store_dir = store_dir
+        self.max_cached_pages = max_cached_pages
+        self._texts = OrderedDict()
+        self._index = None
+        self._index_mtime = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        """the store index, reloaded (and the text cache dropped) when ingestion rewrites it"""
+        try:
+            mtime = os.stat(os.path.join(self.store_dir, index_name)).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._index_mtime:
+                self._index = read_index(self.store_dir)
+                self._index_mtime = mtime
+                self._texts.clear()
+            return self._index
+
+    def has_page(self, page):
+        index = self.index()
+        return index is not None and 0 <= page < index["pages"]
+
+    def etag(self, page, kind):
+        """strong validator: changes whenever the pdf content changes"""
+        return f"{self.index()['sha256'][:16]}-{page}-{kind}"
+
+    def text(self, page):
+        with self._lock:
+            text = self._texts.get(page)
+            if text is not None:
+                self._texts.move_to_end(page)
+                return text
+        with open(page_text_path(self.store_dir, page), "r", encoding="utf-8") as f:
+            text = f.read()
+        with self._lock:
+            self._texts[page] = text
+            while len(self._texts) > self.max_cached_pages:
+                self._texts.popitem(last=False)
+        return text
+
+    def pdf_path(self, page):
+        return page_pdf_path(self.store_dir, page)
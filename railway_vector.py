@@ -1,61 +1,747 @@
-
 # imports
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from keyword_index import KeywordIndex, is_exact_term_query, reciprocal_rank_scores
+from page_store import build_page_store, page_store_current
+from sections import SectionIndex, SectionTracker
+from warmup import keep_alive
+from editions import load_registry
+from retrieval_cache import CachedEmbeddings, CachingRetriever, EmbeddingCache, RetrievalCache
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import hashlib
+import json
 import os
-import uuid # Used to generate unique IDs for each chunk
+import threading
+import time
+
+# vector persistent vector db location
+db_location = os.environ.get("RAG_DB_LOCATION", "./prorail_network_statement_db")
+embedding_model = "mxbai-embed-large"
+# network statement editions (pdf + chroma collection each), see editions.py for the file format
+editions, default_editions = load_registry(os.environ.get("RAG_EDITIONS", "editions.json"), db_location)
+default_edition = editions[default_editions[0]]
+
+# the default edition's files; every edition has the same set in its own directory
+pdf_path = default_edition.pdf_path # make sure the PDF is in the same directory
+collection_name = default_edition.collection_name
+# manifest of what has already been embedded, kept next to the vector db
+manifest_path = default_edition.manifest_path
+# bm25 inverted index over the same chunks, rebuilt at ingestion
+keyword_index_path = default_edition.keyword_index_path
+# chapter/section -> chunk ids, rebuilt at ingestion from the section metadata of the chunks
+section_index_path = default_edition.section_index_path
+# per-page text and single-page pdfs for citations, one directory per source pdf
+page_store_location = default_edition.page_store_location
+# "hybrid" runs bm25 and vector search together, "vector" is plain similarity search
+retrieval_mode = os.environ.get("RAG_RETRIEVAL_MODE", "hybrid")
+# where vector search runs: "chroma", or "flat" for exact search over a memory-mapped export of the embeddings
+vector_backend = os.environ.get("RAG_VECTOR_BACKEND", "chroma")
+flat_index_path = default_edition.flat_index_path
+flat_index_dtype = os.environ.get("RAG_FLAT_INDEX_DTYPE", "float16")
 
-# 1. LOAD THE DOCUMENT
+def get_edition(name=None):
+    """an edition from the registry by name, the default edition for None"""
+    if name is None:
+        return default_edition
+    if name not in editions:
+        raise ValueError(f"unknown edition {name!r}, available: {', '.join(editions)}")
+    return editions[name]
 
-# instead of pandas, we use PyPDFLoader to load the document directly and it  loader automatically splits the document by pages
-pdf_path = "NetworkStatement2026.pdf" # make sure the PDF is in the same directory
-loader = PyPDFLoader(pdf_path)
-documents = loader.load()
+# process-wide caches in front of the retriever (see retrieval_cache.py), 0 turns one off
+embedding_cache_size = int(os.environ.get("RAG_EMBEDDING_CACHE_SIZE", "4096"))
+retrieval_cache_size = int(os.environ.get("RAG_RETRIEVAL_CACHE_SIZE", "1024"))
+# optional jsonl file that keeps query embeddings across restarts
+embedding_cache_path = os.environ.get("RAG_EMBEDDING_CACHE_PATH") or None
+
+# chunks per embedding request and number of embedding requests in flight
+embed_batch_size = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+embed_workers = int(os.environ.get("EMBED_WORKERS", "4"))
 
-# 2. CHUNK THE DOCUMENT
 # split the loaded pages into smaller, more meaningful chunks, RecursiveCharacterTextSplitter: https://python.langchain.com/api_reference/text_splitters/character/langchain_text_splitters.character.RecursiveCharacterTextSplitter.html
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=1000, # size of each chunk in characters
     chunk_overlap=100  # ohw many characters to overlap between chunks
 )
 
-chunks = text_splitter.split_documents(documents)
+def file_sha256(path):
+    """hash of the raw pdf bytes, used to skip ingestion when nothing changed"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-print(f"Loaded {len(documents)} pages and split them into {len(chunks)} chunks.")
+def chunk_id(page, content):
+    """deterministic id for a chunk, derived from its page number and text"""
+    return hashlib.sha256(f"{page}\x00{content}".encode("utf-8")).hexdigest()
 
-# 3. EMBED AND STORE THE CHUNKS
-# initialize embeddings model
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+def iter_chunk_ids(chunks):
+    """
+    Gives every chunk a content-addressed id and stores it in the chunk metadata.
+    Identical chunks on the same page get a numbered suffix so ids stay unique.
+    Works on a stream, yielding (chunk_id, chunk) pairs.
+    """
+    seen = {}
+    for chunk in chunks:
+        base_id = chunk_id(chunk.metadata.get("page"), chunk.page_content)
+        occurrence = seen.get(base_id, 0)
+        seen[base_id] = occurrence + 1
+        cid = base_id if occurrence == 0 else f"{base_id}-{occurrence}"
+        chunk.metadata["chunk_id"] = cid
+        yield cid, chunk
 
-# vector persistent vector db location 
-db_location = "./prorail_network_statement_db"
-vector_store = Chroma(
-    collection_name="network_statement_2026",
-    persist_directory=db_location,
-    embedding_function=embeddings
-)
+# bumped whenever chunk boundaries or chunk metadata change, so unchanged pdfs are re-chunked once
+chunker_version = 3
+
+def iter_pdf_chunks(pdf_path):
+    """
+    Streams pages from the pdf and splits each one as soon as it is loaded. Pages are
+    first cut at chapter/section headings so no chunk spans two sections, and every
+    chunk carries its section_id, section_title, chapter and chapter_title.
+    """
+    # PyPDFLoader loads the document page by page, lazy_load avoids holding the whole pdf in memory
+    loader = PyPDFLoader(pdf_path)
+    sections = SectionTracker()
+    for page in loader.lazy_load():
+        for section, text in sections.split_page(page.page_content):
+            segment = Document(page_content=text, metadata={**page.metadata, **section})
+            yield from text_splitter.split_documents([segment])
+
+def page_store_dir(path, edition=None):
+    return os.path.join(get_edition(edition).page_store_location, os.path.splitext(os.path.basename(path))[0])
+
+def load_manifest(edition=None):
+    """returns the ingest manifest, or None if the store was never ingested incrementally"""
+    edition = get_edition(edition)
+    manifest_path = edition.manifest_path
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return None
+    if "sources" not in manifest:
+        # single-pdf manifest layout, convert to the per-source layout
+        manifest = {"sources": {manifest.get("pdf_path", edition.pdf_path): {
+            "sha256": manifest.get("pdf_sha256"),
+            "chunks": manifest.get("chunks", {}),
+        }}}
+    return manifest
+
+def save_manifest(manifest, edition=None):
+    """writes the manifest atomically so an interrupted run never leaves it half written"""
+    edition = get_edition(edition)
+    os.makedirs(edition.directory, exist_ok=True)
+    tmp_path = edition.manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, edition.manifest_path)
+
+def manifest_from_store(vector_store, edition=None):
+    """
+    Rebuilds the manifest from chroma itself. Used when there is no manifest
+    (e.g. an old uuid-based store) or it disagrees with the collection.
+    """
+    stored = vector_store.get(include=["metadatas"])
+    sources = {}
+    for cid, metadata in zip(stored["ids"], stored["metadatas"]):
+        source = (metadata or {}).get("source", get_edition(edition).pdf_path)
+        entry = sources.setdefault(source, {"sha256": None, "chunks": {}})
+        entry["chunks"][cid] = (metadata or {}).get("page")
+    return {"sources": sources}
 
-# Check if the collection already has documents by trying to get the count
-try:
+def current_manifest(vector_store, edition=None):
+    """the manifest if it matches the collection size, otherwise one read back from chroma"""
+    manifest = load_manifest(edition)
     collection_count = vector_store._collection.count()
-    if collection_count == 0:
-        print("Creating new vector store and adding documents...")
-        # unique IDs for each chunk with UUIDs 
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        vector_store.add_documents(documents=chunks, ids=ids)
-        print("Documents added to the vector store.")
-    else:
-        print(f"Vector store already exists with {collection_count} documents.")
-except Exception as e:
-    print("Creating new vector store and adding documents...")
-    # unique IDs for each chunk with UUIDs 
-    ids = [str(uuid.uuid4()) for _ in chunks]
-    vector_store.add_documents(documents=chunks, ids=ids)
-    print("Documents added to the vector store.")
-
-# creating retriever that returns top 5 most similar documents
-retriever = vector_store.as_retriever(
-    search_kwargs={"k": 5} # retrieve top 5 most relevant chunks
-)
\ No newline at end of file
+    if manifest is not None:
+        manifest_count = sum(len(entry["chunks"]) for entry in manifest["sources"].values())
+        if manifest_count == collection_count:
+            return manifest
+    return manifest_from_store(vector_store, edition)
+
+def chroma_metadata(metadata):
+    """chroma only accepts scalar metadata values"""
+    return {key: value for key, value in metadata.items()
+            if isinstance(value, (str, int, float, bool))}
+
+def embed_batch(batch):
+    """embeds one batch of (chunk_id, chunk) pairs, runs on a worker thread"""
+    return batch, get_embeddings().embed_documents([chunk.page_content for _, chunk in batch])
+
+def iter_batches(pairs, batch_size):
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_pdfs(vector_store, pdf_paths, batch_size=None, workers=None, edition=None):
+    """
+    Streams every pdf of one edition through split -> batch -> parallel embed -> write.
+    Only new or changed chunks are embedded, chunks that no longer exist are deleted.
+    The manifest is saved after every written batch and doubles as the checkpoint:
+    an interrupted run resumes by skipping every chunk id it already recorded.
+    """
+    batch_size = batch_size or embed_batch_size
+    workers = workers or embed_workers
+    edition = get_edition(edition)
+    manifest = current_manifest(vector_store, edition.name)
+    total_added = total_removed = total_unchanged = total_relabelled = 0
+    started = time.perf_counter()
+
+    for path in pdf_paths:
+        entry = manifest["sources"].setdefault(path, {"sha256": None, "chunks": {}})
+        pdf_hash = file_sha256(path)
+        if not page_store_current(page_store_dir(path, edition.name), pdf_hash):
+            print(f"{path}: extracting pages for citations...")
+            build_page_store(path, page_store_dir(path, edition.name), pdf_hash)
+        if entry["sha256"] == pdf_hash and entry["chunks"] and entry.get("chunker") == chunker_version:
+            print(f"{path}: already up to date with {len(entry['chunks'])} chunks.")
+            total_unchanged += len(entry["chunks"])
+            continue
+
+        # ids belonging to other pdfs must never be treated as stale for this one
+        other_ids = set()
+        for other_path, other in manifest["sources"].items():
+            if other_path != path:
+                other_ids.update(other["chunks"])
+        previous_ids = set(entry["chunks"])
+        current_ids = set()
+        # chunks that are already embedded but were chunked by an older version only need new metadata
+        relabel = [] if entry.get("chunker") != chunker_version else None
+
+        def pending_pairs():
+            for cid, chunk in iter_chunk_ids(iter_pdf_chunks(path)):
+                current_ids.add(cid)
+                if cid not in entry["chunks"] and cid not in other_ids:
+                    yield cid, chunk
+                elif relabel is not None:
+                    relabel.append((cid, chunk))
+
+        added = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            batches = iter_batches(pending_pairs(), batch_size)
+            while True:
+                # keep a bounded number of batches in flight so memory stays flat on large pdfs
+                for batch in batches:
+                    in_flight.add(pool.submit(embed_batch, batch))
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, vectors = future.result()
+                    vector_store._collection.upsert(
+                        ids=[cid for cid, _ in batch],
+                        embeddings=vectors,
+                        documents=[chunk.page_content for _, chunk in batch],
+                        metadatas=[chroma_metadata(chunk.metadata) for _, chunk in batch],
+                    )
+                    for cid, chunk in batch:
+                        entry["chunks"][cid] = chunk.metadata.get("page")
+                    save_manifest(manifest, edition.name) # checkpoint
+                    added += len(batch)
+                    elapsed = time.perf_counter() - started
+                    print(f"{path}: embedded {added} chunks ({added / elapsed:.1f} chunks/sec)")
+
+        if relabel:
+            # metadata only, the stored embeddings are kept
+            for batch in iter_batches(relabel, batch_size * 4):
+                vector_store._collection.update(
+                    ids=[cid for cid, _ in batch],
+                    metadatas=[chroma_metadata(chunk.metadata) for _, chunk in batch],
+                )
+            print(f"{path}: updated metadata of {len(relabel)} existing chunks without re-embedding.")
+            total_relabelled += len(relabel)
+
+        stale_ids = list(previous_ids - current_ids)
+        if stale_ids:
+            print(f"{path}: deleting {len(stale_ids)} stale chunks...")
+            vector_store.delete(ids=stale_ids)
+            for cid in stale_ids:
+                entry["chunks"].pop(cid, None)
+        entry["sha256"] = pdf_hash
+        entry["chunker"] = chunker_version
+        save_manifest(manifest, edition.name)
+
+        total_added += added
+        total_removed += len(stale_ids)
+        total_unchanged += len(current_ids) - added
+        print(f"{path}: {len(current_ids)} chunks, {added} added, {len(stale_ids)} removed.")
+
+    changed = total_added or total_removed or total_relabelled
+    if total_added or total_removed or not os.path.exists(edition.keyword_index_path):
+        build_keyword_index(vector_store, edition.name)
+    if changed or not os.path.exists(edition.section_index_path):
+        build_section_index(vector_store, edition.name)
+    if vector_backend == "flat":
+        # the flat index is only exported when it is searched, it needs numpy
+        from flat_index import table_name as flat_index_table
+        if changed or not os.path.exists(os.path.join(edition.flat_index_path, flat_index_table)):
+            build_flat_index(vector_store, edition=edition.name)
+
+    elapsed = time.perf_counter() - started
+    rate = total_added / elapsed if elapsed > 0 else 0.0
+    print(f"{edition.label}: ingestion done in {elapsed:.1f}s: {total_added} added, {total_removed} removed, "
+          f"{total_unchanged} unchanged ({rate:.1f} chunks/sec).")
+
+def build_keyword_index(vector_store, edition=None):
+    """rebuilds the bm25 index from every chunk in the collection and saves it next to the db"""
+    edition = get_edition(edition)
+    stored = vector_store.get(include=["documents"])
+    index = KeywordIndex.build(stored["ids"], stored["documents"])
+    os.makedirs(edition.directory, exist_ok=True)
+    index.save(edition.keyword_index_path)
+    print(f"Keyword index built over {len(index)} chunks.")
+    return index
+
+def build_section_index(vector_store, edition=None):
+    """rebuilds the chapter/section index from the chunk metadata and saves it next to the db"""
+    edition = get_edition(edition)
+    stored = vector_store.get(include=["metadatas"])
+    index = SectionIndex.build(stored["ids"], stored["metadatas"])
+    os.makedirs(edition.directory, exist_ok=True)
+    index.save(edition.section_index_path)
+    print(f"Section index built over {len(index)} sections.")
+    return index
+
+def build_flat_index(vector_store, dtype=None, edition=None):
+    """exports every chunk embedding, text and metadata from chroma into the flat index"""
+    from flat_index import FlatIndex
+    dtype = dtype or flat_index_dtype
+    edition = get_edition(edition)
+    stored = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    index = FlatIndex.build(stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"], dtype=dtype)
+    index.save(edition.flat_index_path)
+    print(f"Flat {dtype} index built over {len(index)} chunks.")
+    return index
+
+# nothing below runs at import time: the store and retriever are only opened on first use,
+# and the pdf is only parsed when ingestion is asked for explicitly
+_lock = threading.Lock()
+_embeddings = None
+_vector_stores = {}
+_retriever = None
+
+def get_embeddings():
+    """the shared embeddings model, created on first use"""
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            _embeddings = OllamaEmbeddings(model=embedding_model, keep_alive=keep_alive)
+        return _embeddings
+
+def get_vector_store(edition=None):
+    """opens an edition's collection (the default edition's without a name) in the persistent chroma store, without touching the pdf"""
+    edition = get_edition(edition)
+    embeddings = get_embeddings()
+    with _lock:
+        if edition.name not in _vector_stores:
+            _vector_stores[edition.name] = Chroma(
+                collection_name=edition.collection_name,
+                persist_directory=db_location,
+                embedding_function=embeddings
+            )
+        return _vector_stores[edition.name]
+
+class RailwayRetriever:
+    """
+    Retrieval service over the persistent vector store.
+    `invoke` mirrors the langchain retriever interface used by the rest of the code,
+    and accepts a precomputed query embedding so callers can avoid embedding twice.
+
+    In hybrid mode bm25 and vector search run side by side and are merged with
+    reciprocal-rank fusion. Exact-term lookups ("TTR", "section 4.2.1") are answered
+    from the keyword index alone, without an embedding call.
+
+    With the "flat" backend the vector search and chunk lookups use the memory-mapped
+    flat index instead of chroma (chroma is still used if the index was never built).
+
+    A `section` ("4", "4.2", "4.2.1") limits every search to the chunks of that chapter
+    or section before any scoring happens.
+
+    One retriever searches one edition's collection and indexes. Queries are embedded
+    with `embeddings` (the shared cached embeddings in get_retriever), or the vector
+    store's own model.
+    """
+
+    def __init__(self, vector_store, k=5, mode="hybrid", backend="chroma", edition=None, embeddings=None):
+        self.vector_store = vector_store
+        self.embeddings = embeddings or vector_store.embeddings
+        self.k = k
+        self.mode = mode
+        self.backend = backend
+        self.edition = get_edition(edition)
+        self._indexes = {}  # name -> (file mtime, loaded index)
+        self._index_lock = threading.Lock()
+        # runs the vector search while the keyword search happens on the calling thread
+        self._pool = ThreadPoolExecutor(max_workers=4)
+
+    def _load_index(self, name, path, load, load_path=None):
+        """an index file loaded on first use and reloaded when ingestion rewrites it; None if it was never built"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._index_lock:
+            cached = self._indexes.get(name)
+            if cached is None or cached[0] != mtime:
+                cached = self._indexes[name] = (mtime, load(load_path or path))
+            return cached[1]
+
+    @property
+    def keyword_index(self):
+        """the bm25 index, None outside hybrid mode"""
+        if self.mode != "hybrid":
+            return None
+        return self._load_index("keyword", self.edition.keyword_index_path, KeywordIndex.load)
+
+    @property
+    def flat_index(self):
+        """the flat index, None unless the flat backend is selected"""
+        if self.backend != "flat":
+            return None
+        from flat_index import FlatIndex, table_name as flat_index_table
+        return self._load_index("flat", os.path.join(self.edition.flat_index_path, flat_index_table),
+                                FlatIndex.load, self.edition.flat_index_path)
+
+    @property
+    def section_index(self):
+        return self._load_index("section", self.edition.section_index_path, SectionIndex.load)
+
+    def section_scope(self, section):
+        """
+        the section ids and chunk ids a search is limited to, None for no limit.
+        An unknown section gives an empty scope (no results) rather than silently searching everything.
+        """
+        if not section:
+            return None
+        index = self.section_index
+        if index is None:
+            print("No section index, run railway_vector.py to build it. Searching all sections.")
+            return None
+        section = str(section).strip().rstrip(".")
+        return {"section_ids": index.section_ids(section), "chunk_ids": index.chunk_ids(section)}
+
+    def embed_query(self, query):
+        return self.embeddings.embed_query(query)
+
+    def wants_embedding(self, query):
+        """False when the query will be answered from the keyword index alone"""
+        return not (is_exact_term_query(query) and self.keyword_index is not None)
+
+    def vector_search(self, query, k, embedding=None, scope=None):
+        return [doc for doc, _ in self.vector_search_scored(query, k, embedding, scope)]
+
+    def vector_search_scored(self, query, k, embedding=None, scope=None):
+        """(document, score) pairs best first, higher is more similar: cosine for the flat index, negated distance for chroma"""
+        if scope is not None and not scope["chunk_ids"]:
+            return []
+        if embedding is None:
+            embedding = self.embed_query(query)
+        flat = self.flat_index
+        if flat is not None:
+            rows = flat.rows_for(scope["chunk_ids"]) if scope is not None else None
+            hits = flat.search(embedding, k, rows)
+            docs = self.docs_by_ids([cid for cid, _ in hits])
+            return list(zip(docs, [score for _, score in hits]))
+        # chroma applies the metadata filter before the similarity search
+        section_filter = {"section_id": {"$in": scope["section_ids"]}} if scope is not None else None
+        hits = self.vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=section_filter)
+        return [(doc, -distance) for doc, distance in hits]
+
+    def vector_search_batch(self, queries, k=None, embeddings=None):
+        """
+        vector search for many queries: one batched embedding call and, with the flat
+        backend, one matrix product for all of them. Returns a list of documents per query.
+        """
+        k = k or self.k
+        if embeddings is None:
+            embeddings = self.embeddings.embed_documents(list(queries))
+        flat = self.flat_index
+        if flat is None:
+            return [self.vector_store.similarity_search_by_vector(embedding, k=k) for embedding in embeddings]
+        return [self.docs_by_ids([cid for cid, _ in hits]) for hits in flat.search_batch(embeddings, k)]
+
+    def docs_by_ids(self, ids):
+        """fetches chunks by id from the flat index or chroma (no embedding involved), keeping the given order"""
+        if not ids:
+            # chroma rejects an empty id list
+            return []
+        flat = self.flat_index
+        if flat is not None:
+            return [Document(page_content=text, metadata={**metadata, "chunk_id": cid})
+                    for cid, text, metadata in flat.records(ids)]
+        stored = self.vector_store.get(ids=list(ids), include=["documents", "metadatas"])
+        by_id = {}
+        for cid, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            metadata = dict(metadata or {})
+            metadata.setdefault("chunk_id", cid)
+            by_id[cid] = Document(page_content=text, metadata=metadata)
+        return [by_id[cid] for cid in ids if cid in by_id]
+
+    def invoke(self, query, k=None, embedding=None, section=None):
+        return [doc for doc, _ in self.invoke_scored(query, k, embedding, section)]
+
+    def invoke_scored(self, query, k=None, embedding=None, section=None):
+        """
+        (document, score) pairs best first. Hybrid and keyword-only results score by
+        reciprocal-rank fusion, vector-only results by similarity.
+        """
+        k = k or self.k
+        vector_hits, keyword_hits = self.candidates(query, k, embedding, section)
+        docs = {doc_chunk_id(doc): doc for doc, _ in vector_hits or []}
+        if vector_hits is not None:
+            vector_hits = [(doc_chunk_id(doc), score) for doc, score in vector_hits]
+        fused = fuse_hits(vector_hits, keyword_hits, k)
+        missing = [cid for cid, _ in fused if cid not in docs]
+        if missing:
+            docs.update({doc_chunk_id(doc): doc for doc in self.docs_by_ids(missing)})
+        return [(docs[cid], score) for cid, score in fused if cid in docs]
+
+    def candidates(self, query, k=None, embedding=None, section=None):
+        """
+        The unfused candidate lists, best first: vector hits as (document, similarity)
+        pairs and keyword hits as (chunk id, bm25 score) pairs, None for a side that is
+        not searched. When both are searched they are fetched deeper than k, so fusion
+        has something to work with.
+        """
+        k = k or self.k
+        scope = self.section_scope(section)
+        if scope is not None and not scope["chunk_ids"]:
+            return [], None
+        allowed = scope["chunk_ids"] if scope is not None else None
+        index = self.keyword_index
+        if index is None:
+            return self.vector_search_scored(query, k, embedding, scope), None
+
+        if embedding is None and is_exact_term_query(query):
+            keyword_hits = index.search(query, k, allowed)
+            if keyword_hits:
+                return None, keyword_hits
+
+        fetch_k = k * 4
+        vector_future = self._pool.submit(self.vector_search_scored, query, fetch_k, embedding, scope)
+        keyword_hits = index.search(query, fetch_k, allowed)
+        return vector_future.result(), keyword_hits
+
+def fuse_hits(vector_hits, keyword_hits, k):
+    """
+    the top k (key, score) pairs of keyed candidate lists: by similarity when only the
+    vector side was searched, otherwise by reciprocal-rank fusion of the searched lists
+    """
+    if keyword_hits is None:
+        return (vector_hits or [])[:k]
+    rankings = [[key for key, _ in hits] for hits in (vector_hits, keyword_hits) if hits is not None]
+    return reciprocal_rank_scores(rankings)[:k]
+
+class EditionRetriever:
+    """
+    Fans a query out over the retrievers of several editions and ranks their results
+    together. The query is embedded once, then every edition is searched on its own
+    thread, so a query costs about as much as the slowest edition, not the sum of all.
+    The editions' vector hits are merged by similarity and their keyword hits by bm25
+    score before one reciprocal-rank fusion, so a weak hit in one edition never
+    outranks a strong one in another just because it came first in its own edition.
+    Every returned chunk carries its `edition` (and, with more than one edition
+    registered, its `edition_label`) in the metadata for the citations.
+
+    The single-edition helpers (`section_index`, `keyword_index`, `flat_index`,
+    `vector_store`, `vector_search_batch`) use the default edition.
+    """
+
+    def __init__(self, retrievers, default_editions, k=5):
+        self.retrievers = retrievers
+        self.default_editions = default_editions
+        self.k = k
+        self._pool = ThreadPoolExecutor(max_workers=max(4, len(retrievers) * 2))
+
+    def retriever(self, edition=None):
+        """the retriever of one edition, the default edition's for None"""
+        return self.retrievers[get_edition(edition).name]
+
+    def selected(self, editions=None):
+        return [self.retrievers[get_edition(name).name] for name in (editions or self.default_editions)]
+
+    def wants_embedding(self, query, editions=None):
+        return any(retriever.wants_embedding(query) for retriever in self.selected(editions))
+
+    def embed_query(self, query):
+        return self.retriever().embed_query(query)
+
+    def invoke(self, query, k=None, embedding=None, section=None, editions=None):
+        k = k or self.k
+        retrievers = self.selected(editions)
+        if embedding is None and self.wants_embedding(query, editions):
+            embedding = self.embed_query(query)
+        if len(retrievers) == 1:
+            searched = [(retrievers[0], retrievers[0].candidates(query, k, embedding, section))]
+        else:
+            futures = [(retriever, self._pool.submit(retriever.candidates, query, k, embedding, section))
+                       for retriever in retrievers]
+            searched = [(retriever, future.result()) for retriever, future in futures]
+        docs = {}
+        vector_hits = keyword_hits = None
+        for retriever, (edition_vector_hits, edition_keyword_hits) in searched:
+            name = retriever.edition.name
+            if edition_vector_hits is not None:
+                vector_hits = vector_hits or []
+                for doc, score in edition_vector_hits:
+                    docs[name, doc_chunk_id(doc)] = doc
+                    vector_hits.append(((name, doc_chunk_id(doc)), score))
+            if edition_keyword_hits is not None:
+                keyword_hits = keyword_hits or []
+                keyword_hits.extend(((name, cid), score) for cid, score in edition_keyword_hits)
+        for hits in (vector_hits, keyword_hits):
+            if hits is not None:
+                hits.sort(key=lambda item: item[1], reverse=True)
+        fused = fuse_hits(vector_hits, keyword_hits, k)
+
+        missing = {}
+        for name, cid in (key for key, _ in fused if key not in docs):
+            missing.setdefault(name, []).append(cid)
+        for name, ids in missing.items():
+            docs.update({(name, doc_chunk_id(doc)): doc for doc in self.retrievers[name].docs_by_ids(ids)})
+        results = []
+        for key, _ in fused:
+            doc = docs.get(key)
+            if doc is None:
+                continue
+            doc.metadata["edition"] = key[0]
+            if len(self.retrievers) > 1:
+                doc.metadata["edition_label"] = self.retrievers[key[0]].edition.label
+            results.append(doc)
+        return results
+
+    @property
+    def vector_store(self):
+        return self.retriever().vector_store
+
+    @property
+    def keyword_index(self):
+        return self.retriever().keyword_index
+
+    @property
+    def flat_index(self):
+        return self.retriever().flat_index
+
+    @property
+    def section_index(self):
+        return self.retriever().section_index
+
+    def vector_search_batch(self, queries, k=None, embeddings=None):
+        return self.retriever().vector_search_batch(queries, k, embeddings)
+
+    def docs_by_ids(self, ids):
+        return self.retriever().docs_by_ids(ids)
+
+def get_retriever():
+    """
+    the shared retriever over every registered edition, returning the top 5 most relevant chunks;
+    query embeddings and results are cached process-wide, so every caller shares the hits
+    """
+    global _retriever
+    model = get_embeddings()
+    vector_stores = {name: get_vector_store(name) for name in editions}
+    with _lock:
+        if _retriever is None:
+            # every edition embeds through the same cache, including a keyword-only query's vector fallback
+            embeddings = CachedEmbeddings(model, EmbeddingCache(embedding_model, embedding_cache_size,
+                                                                      embedding_cache_path))
+            _retriever = CachingRetriever(
+                EditionRetriever({
+                    name: RailwayRetriever(vector_store, k=5, mode=retrieval_mode, backend=vector_backend,
+                                           edition=name, embeddings=embeddings)
+                    for name, vector_store in vector_stores.items()
+                }, default_editions, k=5), # retrieve top 5 most relevant chunks
+                embeddings,
+                RetrievalCache(store_fingerprint, retrieval_cache_size),
+            )
+        return _retriever
+
+def doc_chunk_id(doc):
+    """the content-addressed id of a retrieved chunk"""
+    return doc.metadata.get("chunk_id") or getattr(doc, "id", None)
+
+def doc_source_id(doc):
+    """
+    the chunk id qualified with the chunk's edition, for cache keys: chunk ids hash only
+    page and text, so the same passage in two editions has the same chunk id
+    """
+    return f"{doc.metadata.get('edition') or default_edition.name}:{doc_chunk_id(doc)}"
+
+def store_fingerprint():
+    """
+    Cheap token that changes whenever the store content changes: per edition, the collection
+    size plus the manifest modification time (ingestion rewrites the manifest on every change).
+    """
+    parts = []
+    for name, edition in editions.items():
+        collection_count = get_vector_store(name)._collection.count()
+        try:
+            manifest_mtime = os.stat(edition.manifest_path).st_mtime_ns
+        except OSError:
+            manifest_mtime = 0
+        parts.append(f"{collection_count}:{manifest_mtime}")
+    return "|".join(parts)
+
+def live_chunk_ids():
+    """the doc_source_id of every chunk currently in the store, over all editions"""
+    ids = set()
+    for name in editions:
+        manifest = current_manifest(get_vector_store(name), name)
+        ids.update(f"{name}:{cid}" for entry in manifest["sources"].values() for cid in entry["chunks"])
+    return ids
+
+def ingest(pdf_paths=None, batch_size=None, workers=None, edition=None):
+    """parses and embeds the given pdfs (the edition's network statement by default) into the edition's collection"""
+    edition = get_edition(edition)
+    ingest_pdfs(get_vector_store(edition.name), pdf_paths or [edition.pdf_path],
+                batch_size=batch_size, workers=workers, edition=edition.name)
+
+def rebuild_keyword_index(edition=None):
+    """builds the bm25 index for an existing store without re-ingesting"""
+    return build_keyword_index(get_vector_store(edition), edition)
+
+def rebuild_flat_index(dtype=None, edition=None):
+    """exports the flat index for an existing store without re-ingesting"""
+    return build_flat_index(get_vector_store(edition), dtype, edition)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest Network Statement PDFs into the vector store.")
+    parser.add_argument("pdfs", nargs="*", help="pdf files to ingest (default: the edition's pdf)")
+    parser.add_argument("--edition", action="append", choices=list(editions) + ["all"], default=None,
+                        help=f"edition to ingest or rebuild, repeatable or 'all' (default: {default_edition.name})")
+    parser.add_argument("--batch-size", type=int, default=None, help="chunks per embedding request")
+    parser.add_argument("--workers", type=int, default=None, help="embedding requests in flight")
+    parser.add_argument("--keyword-index-only", action="store_true", help="only rebuild the bm25 keyword index")
+    parser.add_argument("--flat-index-only", action="store_true", help="only rebuild the flat vector index")
+    parser.add_argument("--flat-dtype", default=None, help="flat index precision: float16 or int8")
+    args = parser.parse_args()
+    if args.flat_dtype is not None:
+        from flat_index import FlatIndex
+        if args.flat_dtype not in FlatIndex.dtypes:
+            parser.error(f"--flat-dtype must be one of {', '.join(FlatIndex.dtypes)}")
+    selected = list(editions) if "all" in (args.edition or []) else (args.edition or [default_edition.name])
+    if args.pdfs and len(selected) > 1:
+        parser.error("pdf files can only be given for a single edition")
+    for name in selected:
+        if args.keyword_index_only or args.flat_index_only:
+            if args.keyword_index_only:
+                rebuild_keyword_index(name)
+            if args.flat_index_only:
+                rebuild_flat_index(args.flat_dtype, name)
+        else:
+            ingest(args.pdfs or None, batch_size=args.batch_size, workers=args.workers, edition=name)
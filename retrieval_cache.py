@@ -0,0 +1,257 @@
+# process-wide caches in front of the retriever: query embeddings and retrieval results
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from concurrency import RequestCoalescer
+
+def normalize_query(text):
+    """whitespace-collapsed text; case is kept, the embedding model is case-sensitive"""
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """
+    Query text -> embedding, least-recently-used beyond `max_entries` (0 disables it).
+    Embeddings never go stale for a given model, so with `persist_path` every new one
+    is appended to a jsonl file and the most recent ones are loaded again on start.
+    The file is rewritten with only the live entries once it holds twice as many lines.
+    """
+
+    def __init__(self, model, max_entries=4096, persist_path=None):
+        self.model = model
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._persisted_lines = 0
+        self._lock = threading.Lock()
+        if persist_path and max_entries:
+            self._load()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text, embedding):
+        if not self.max_entries:
+            return
+        key = self.key(text)
+        embedding = list(embedding)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.persist_path:
+                self._append(key, embedding)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _append(self, key, embedding):
+        if self._persisted_lines >= 2 * self.max_entries:
+            self._compact()
+            return
+        with open(self.persist_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "embedding": embedding}) + "\n")
+        self._persisted_lines += 1
+
+    def _compact(self):
+        tmp_path = self.persist_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, embedding in self._entries.items():
+                f.write(json.dumps({"key": key, "embedding": embedding}) + "\n")
+        os.replace(tmp_path, self.persist_path)
+        self._persisted_lines = len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line cut short by a crash, the rest of the file is still fine
+                        continue
+                    self._entries[record["key"]] = record["embedding"]
+                    self._entries.move_to_end(record["key"])
+                    self._persisted_lines += 1
+        except OSError as e:
+            print(f"ignoring unreadable embedding cache {self.persist_path}: {e}")
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class RetrievalCache:
+    """
+    Retrieval key -> retrieved documents, least-recently-used beyond `max_entries`
+    (0 disables it). Everything is dropped when the store fingerprint changes; the
+    fingerprint is checked at most every `check_interval` seconds, so results can
+    trail a re-ingestion by that long.
+    """
+
+    def __init__(self, fingerprint, max_entries=1024, check_interval=5.0):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._current = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _check_fingerprint(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        current = self.fingerprint()
+        if current != self._current:
+            if self._entries:
+                print("vector store changed, clearing retrieval cache")
+            self._entries.clear()
+            self._current = current
+
+    def get(self, key):
+        if not self.max_entries:
+            return None
+        with self._lock:
+            self._check_fingerprint()
+            docs = self._entries.get(key)
+            if docs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return docs
+
+    def put(self, key, docs):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = docs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+class CachedEmbeddings:
+    """
+    An embeddings model behind an EmbeddingCache, with the same embed_query and
+    embed_documents methods, so every retriever that embeds a query shares the cache.
+    Concurrent misses for the same text share one embedding call, and embed_documents
+    sends only the uncached texts, in one batched call.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self._inflight = RequestCoalescer()
+
+    def embed_query(self, text):
+        embedding = self.cache.get(text)
+        if embedding is None:
+            embedding = self._inflight.run(normalize_query(text), lambda: self._embed_and_cache(text))
+        return embedding
+
+    def _embed_and_cache(self, text):
+        # only the caller that computed the embedding stores it, so it is persisted once
+        embedding = self.embeddings.embed_query(text)
+        self.cache.put(text, embedding)
+        return embedding
+
+    def embed_documents(self, texts):
+        embeddings = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for text, embedding in computed.items():
+                self.cache.put(text, embedding)
+            embeddings = [embedding if embedding is not None else computed[text]
+                          for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+def copy_docs(docs):
+    """fresh documents, so a caller editing metadata never changes a cached result"""
+    return [type(doc)(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+
+class CachingRetriever:
+    """
+    Wraps the edition retriever with the retrieval cache; `embeddings` is the
+    CachedEmbeddings the wrapped retrievers embed with as well. Repeated or
+    identical text is embedded once per process, and a repeated retrieval (same query,
+    k, section and editions) skips the search entirely. Concurrent identical misses
+    share one embedding call or one search. Everything else is passed through to the
+    wrapped retriever.
+    """
+
+    def __init__(self, retriever, embeddings, result_cache):
+        self.inner = retriever
+        self.embeddings = embeddings
+        self.result_cache = result_cache
+        self._inflight = RequestCoalescer()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def wants_embedding(self, query, editions=None):
+        return self.inner.wants_embedding(query, editions)
+
+    def embed_query(self, query):
+        return self.embeddings.embed_query(query)
+
+    def embed_queries(self, queries):
+        """embeddings for many queries, the uncached ones in one batched call"""
+        return self.embeddings.embed_documents(queries)
+
+    def lookup(self, query, k=None, embedding=None, section=None, editions=None):
+        """(documents, True if they came from the cache)"""
+        k = k or self.inner.k
+        if embedding is None and self.wants_embedding(query, editions):
+            embedding = self.embed_query(query)
+        key = (normalize_query(query), k, section or None,
+               tuple(editions or self.inner.default_editions), embedding is not None)
+        docs = self.result_cache.get(key)
+        if docs is not None:
+            return copy_docs(docs), True
+        docs = self._inflight.run(key, lambda: self.inner.invoke(query, k, embedding, section, editions))
+        self.result_cache.put(key, docs)
+        return copy_docs(docs), False
+
+    def invoke(self, query, k=None, embedding=None, section=None, editions=None):
+        return self.lookup(query, k, embedding, section, editions)[0]
+
+    def stats(self):
+        return {"embeddings": self.embeddings.cache.stats(), "retrieval": self.result_cache.stats()}
@@ -0,0 +1,195 @@
+# chapter/section structure of the network statement: heading detection at ingestion and a section index
+import json
+import os
+import re
+
+# "4.2.1 Capacity allocation" / "4 ALLOCATION OF CAPACITY", a numbered line with a short title
+heading_regex = re.compile(r"^\s*(\d{1,2}(?:\.\d{1,2}){0,4})\.?\s+([A-Za-z][^\n]*?)\s*$")
+# table of contents lines end in a page number ("4.2 Capacity .......... 57")
+toc_line = re.compile(r"(?:\.{2,}|\s)\s*\d+$")
+max_title_words = 14
+
+def parse_heading(line):
+    """(number tuple, title) for a heading line, or None"""
+    match = heading_regex.match(line)
+    if match is None:
+        return None
+    number, title = match.groups()
+    if not title[0].isupper() or toc_line.search(title) or title.endswith((".", ",", ";", ":")):
+        return None
+    if len(title.split()) > max_title_words:
+        return None
+    return tuple(int(part) for part in number.split(".")), title
+
+def toc_entry(line):
+    """(number tuple, lowercased title) for a table of contents line, or None"""
+    match = heading_regex.match(line)
+    if match is None or not toc_line.search(match.group(2)):
+        return None
+    number, title = match.groups()
+    return tuple(int(part) for part in number.split(".")), toc_title(toc_line.sub("", title))
+
+def toc_title(title):
+    return " ".join(title.rstrip(". ").lower().split())
+
+def follows(previous, number):
+    """
+    True if `number` is a plausible next heading after `previous`: a first subsection,
+    a small step forward within the chapter, or the start of the next chapter. Numbered
+    list items and stray numbers in the text rarely continue the heading sequence, so
+    this filters most false positives; a bare chapter number still needs confirming
+    (see SectionTracker).
+    """
+    if previous is None:
+        return number[0] <= 2 and all(part <= 2 for part in number[1:])
+    if len(number) == len(previous) + 1 and number[:-1] == previous:
+        return 1 <= number[-1] <= 3
+    if number[0] != previous[0]:
+        return number[0] == previous[0] + 1 and all(part <= 2 for part in number[1:])
+    for depth in range(2, min(len(previous), len(number)) + 1):
+        if number[:depth - 1] == previous[:depth - 1] and 0 < number[depth - 1] - previous[depth - 1] <= 3:
+            return all(part <= 2 for part in number[depth:])
+    return False
+
+def section_id(number):
+    return ".".join(str(part) for part in number)
+
+class SectionTracker:
+    """
+    Follows the heading structure across pages while the pdf streams through. A bare
+    chapter heading ("2 Infrastructure") is only taken when the table of contents lists
+    it or its first subsection ("2.1 ...") follows; until then its lines stay in the
+    current section, so a numbered list ("2 Access conditions") never starts a chapter.
+    """
+
+    def __init__(self):
+        self.number = None
+        self.titles = {}
+        self.toc = {}
+        self.pending = None
+
+    def metadata(self):
+        """chunk metadata for the section currently in effect"""
+        if self.number is None:
+            return {}
+        return {
+            "section_id": section_id(self.number),
+            "section_title": self.titles[self.number],
+            "chapter": str(self.number[0]),
+            "chapter_title": self.titles.get(self.number[:1], ""),
+        }
+
+    def start(self, number, title):
+        self.number = number
+        self.titles[number] = title
+
+    def split_page(self, text):
+        """yields (section metadata, text) segments of one page, cut at every heading"""
+        segment = []
+        # the lines from an unconfirmed chapter heading on
+        held = []
+        for line in text.splitlines(keepends=True):
+            heading = parse_heading(line)
+            if heading is None:
+                entry = toc_entry(line)
+                if entry is not None:
+                    self.toc[entry[0]] = entry[1]
+            elif self.pending is not None and heading[0][:1] == self.pending[0] and follows(self.pending[0], heading[0]):
+                # the pending chapter heading is confirmed by its first subsection
+                yield from self.segments(segment)
+                self.start(*self.pending)
+                yield from self.segments(held)
+                segment, held, self.pending = [], [], None
+                self.start(*heading)
+            elif follows(self.number, heading[0]):
+                segment.extend(held)
+                held, self.pending = [], None
+                if len(heading[0]) == 1 and self.toc.get(heading[0]) != toc_title(heading[1]):
+                    self.pending = heading
+                    held.append(line)
+                    continue
+                yield from self.segments(segment)
+                segment = []
+                self.start(*heading)
+            (held if self.pending is not None else segment).append(line)
+        # a chapter heading still unconfirmed at the end of the page leaves its lines in
+        # the current section; it can still be confirmed on a later page
+        yield from self.segments(segment + held)
+
+    def segments(self, lines):
+        if "".join(lines).strip():
+            yield self.metadata(), "".join(lines)
+
+def matches(candidate, prefix):
+    """"4.2" matches section 4.2 and everything below it, "4" the whole chapter"""
+    return candidate == prefix or candidate.startswith(prefix + ".")
+
+def section_sort_key(sid):
+    return tuple(int(part) for part in sid.split("."))
+
+class SectionIndex:
+    """section id -> title, chapter, pages and chunk ids, rebuilt from the chunk metadata at ingestion"""
+
+    def __init__(self, sections=None):
+        self.sections = sections or {}
+
+    @classmethod
+    def build(cls, ids, metadatas):
+        sections = {}
+        for cid, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            sid = metadata.get("section_id")
+            if not sid:
+                continue
+            entry = sections.setdefault(sid, {
+                "title": metadata.get("section_title", ""),
+                "chapter": metadata.get("chapter", sid.split(".")[0]),
+                "pages": [],
+                "chunk_ids": [],
+            })
+            entry["chunk_ids"].append(cid)
+            page = metadata.get("page")
+            if isinstance(page, int) and page not in entry["pages"]:
+                entry["pages"].append(page)
+        for entry in sections.values():
+            entry["pages"].sort()
+        return cls(sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def section_ids(self, prefix):
+        return [sid for sid in self.sections if matches(sid, prefix)]
+
+    def chunk_ids(self, prefix):
+        """every chunk in the section (or chapter) and its subsections"""
+        return {cid for sid in self.section_ids(prefix) for cid in self.sections[sid]["chunk_ids"]}
+
+    def listing(self):
+        """sections in document order, without their chunk ids"""
+        return [{
+            "id": sid,
+            "title": self.sections[sid]["title"],
+            "chapter": self.sections[sid]["chapter"],
+            "pages": self.sections[sid]["pages"],
+            "chunks": len(self.sections[sid]["chunk_ids"]),
+        } for sid in sorted(self.sections, key=section_sort_key)]
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sections": self.sections}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["sections"])
+
+def section_label(metadata):
+    """"Section 4.2.1 Capacity allocation" for a chunk, None if it has no section"""
+    sid = metadata.get("section_id")
+    if not sid:
+        return None
+    title = metadata.get("section_title")
+    return f"Section {sid} {title}" if title else f"Section {sid}"
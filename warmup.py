@@ -0,0 +1,175 @@
+# model warm-up and keep-alive: ollama loads a model on its first request and unloads it
+# when idle, so without this the first question after a (re)start or a quiet period is slow
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from health_monitor import ollama_base_url
+
+def parse_keep_alive(value):
+    """
+    Seconds a model stays loaded after its last request, from "30m", "2h", "90s", "600"
+    or "-1" (never unload). Seconds are accepted by both langchain ollama clients.
+    """
+    value = str(value).strip().lower()
+    match = re.fullmatch(r"(-?\d+)\s*([smh]?)", value)
+    if match is None:
+        raise ValueError(f"invalid keep-alive {value!r}, use e.g. 30m, 2h, 600 or -1")
+    amount, unit = int(match.group(1)), match.group(2)
+    if amount < 0:
+        return -1
+    return amount * {"": 1, "s": 1, "m": 60, "h": 3600}[unit]
+
+# passed on every request by the llm and embedding clients, ollama's own default is 5 minutes
+keep_alive = parse_keep_alive(os.environ.get("RAG_KEEP_ALIVE", "30m"))
+# load both models when the app starts
+warmup_enabled = os.environ.get("RAG_WARMUP", "1") == "1"
+# seconds between re-warms, 0 turns the schedule off (keep it below RAG_KEEP_ALIVE)
+warmup_interval = float(os.environ.get("RAG_WARMUP_INTERVAL", "0"))
+warmup_timeout = float(os.environ.get("RAG_WARMUP_TIMEOUT", "300"))
+
+def ollama_request(path, payload=None, timeout=10.0):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(f"{ollama_base_url()}{path}", data=data,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+def loaded_models(timeout=2.0):
+    """names of the models ollama currently holds in memory (GET /api/ps)"""
+    models = ollama_request("/api/ps", timeout=timeout).get("models", [])
+    return {entry.get("name") for entry in models} | {entry.get("model") for entry in models}
+
+def is_loaded(name, loaded):
+    return name in loaded or (":" not in name and f"{name}:latest" in loaded)
+
+def warm_llm(name, timeout):
+    """one generated token, the same path a question takes (model load, prompt eval, first token)"""
+    return ollama_request("/api/generate", {
+        "model": name, "prompt": "ok", "stream": False,
+        "keep_alive": keep_alive, "options": {"num_predict": 1},
+    }, timeout=timeout)
+
+def warm_embedding(name, timeout):
+    return ollama_request("/api/embed", {"model": name, "input": "warm-up", "keep_alive": keep_alive}, timeout=timeout)
+
+class ModelWarmer:
+    """
+    Loads the llm and embedding models into ollama and measures what a request costs
+    with the model cold (loaded by this request) and warm (already in memory).
+
+    `warm_now` sends each model one tiny request with the configured keep-alive, which
+    loads it if needed and restarts its unload timer. Started with `start`, this runs
+    on a daemon thread at startup and then every `interval` seconds (0: startup only).
+    `extra` callables (e.g. opening the vector store and indexes) run after the models,
+    their timings are reported alongside.
+    """
+
+    def __init__(self, llm_models, embedding_models, interval=0.0, timeout=300.0, extra=None):
+        self.models = [(name, "llm") for name in llm_models] + [(name, "embedding") for name in embedding_models]
+        self.interval = interval
+        self.timeout = timeout
+        self.extra = extra or {}
+        self.state = "idle"
+        self._results = {}
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.warm_now("startup")
+        while self.interval > 0 and not self._stop.wait(self.interval):
+            self.warm_now("scheduled")
+
+    def warm_now(self, reason="manual"):
+        """warms every model once on the calling thread, returns the status"""
+        with self._warm_lock:
+            self.state = "warming"
+            try:
+                loaded = loaded_models()
+            except Exception:
+                loaded = set()
+            for name, kind in self.models:
+                was_loaded = is_loaded(name, loaded)
+                if self._measure(name, kind, was_loaded, reason) and not was_loaded:
+                    # a second request right after the load is the steady-state latency
+                    self._measure(name, kind, True, reason)
+            for name, step in self.extra.items():
+                self._measure_step(name, step, reason)
+            self.state = "ready" if all(result.get("error") is None for result in self._results.values()) else "error"
+        return self.status()
+
+    def _measure(self, name, kind, warm, reason):
+        started = time.perf_counter()
+        error = None
+        response = {}
+        try:
+            response = (warm_llm if kind == "llm" else warm_embedding)(name, self.timeout)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            result = self._results.setdefault(name, {"kind": kind, "cold_ms": None, "warm_ms": None, "warmups": 0})
+            result["error"] = error
+            if error is None:
+                result["warm_ms" if warm else "cold_ms"] = elapsed_ms
+                if not warm:
+                    # ollama reports how much of the cold request was spent loading the model
+                    result["load_ms"] = round(response.get("load_duration", 0) / 1e6, 1)
+                result["warmups"] += 1
+                result["last_reason"] = reason
+                result["warmed_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        return error is None
+
+    def _measure_step(self, name, step, reason):
+        started = time.perf_counter()
+        error = None
+        try:
+            step()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        with self._lock:
+            self._results[name] = {
+                "kind": "step",
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+                "error": error,
+                "last_reason": reason,
+            }
+
+    def status(self):
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        return {
+            "state": self.state,
+            "keep_alive_seconds": keep_alive,
+            "interval_seconds": self.interval,
+            "models": results,
+        }
+
+    def report(self):
+        """one line per model: cold vs warm latency"""
+        lines = []
+        for name, result in self.status()["models"].items():
+            if result.get("error"):
+                lines.append(f"{name}: warm-up failed ({result['error']})")
+            elif result["kind"] == "step":
+                lines.append(f"{name}: {result['ms']:.0f} ms")
+            else:
+                cold = f"{result['cold_ms']:.0f} ms (load {result.get('load_ms', 0):.0f} ms)" if result["cold_ms"] is not None else "already loaded"
+                warm = f"{result['warm_ms']:.0f} ms" if result["warm_ms"] is not None else "n/a"
+                lines.append(f"{name}: cold {cold}, warm {warm}")
+        return lines